@@ -15,6 +15,13 @@ if not USE_SUPABASE:
     import pymysql
     pymysql.install_as_MySQLdb()
 
+# Cache and session configuration
+# CACHE_URL selects a shared cache (redis://host:6379/0 or memcached://host:11211);
+# without it each process uses its own in-memory cache.
+# SESSION_STORE is 'db' (default), 'cached_db' or 'cache'.
+CACHE_URL = os.getenv('CACHE_URL', '')
+SESSION_STORE = os.getenv('SESSION_STORE', 'db')
+
 # Supabase configuration
 SUPABASE_DB_HOST = os.getenv('SUPABASE_DB_HOST', '')
 SUPABASE_DB_NAME = os.getenv('SUPABASE_DB_NAME', 'postgres')
@@ -55,6 +62,7 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'marketplace.middleware.SeparateAdminSessionMiddleware',
+    'marketplace.middleware.RateLimitMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -130,6 +138,56 @@ else:
 #     }
 # }
 
+# Cache Configuration
+if CACHE_URL.startswith(('redis://', 'rediss://')):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+elif CACHE_URL.startswith('memcached://'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': CACHE_URL[len('memcached://'):],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Generated AI text, keyed by prompt hash. Shares the configured backend
+# under its own prefix; the in-memory fallback evicts least recently used.
+CACHES['ai_content'] = dict(CACHES['default'], KEY_PREFIX='ai_content')
+if 'LocMemCache' in CACHES['ai_content']['BACKEND']:
+    CACHES['ai_content'].update({'LOCATION': 'ai_content', 'OPTIONS': {'MAX_ENTRIES': 2000}})
+
+# Session Configuration
+# Cached sessions and users need a cache shared by all workers: with the
+# per-process cache a logout, deactivation or password change would only be
+# seen by the worker that handled it. Without CACHE_URL sessions stay in the db.
+if CACHE_URL and SESSION_STORE == 'cache':
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
+elif CACHE_URL and SESSION_STORE == 'cached_db':
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Serve authenticated users from the cache as well when sessions are cached.
+# ModelBackend stays listed so sessions created before the switch stay valid.
+if CACHE_URL and SESSION_STORE != 'db':
+    AUTHENTICATION_BACKENDS = [
+        'marketplace.backends.CachedModelBackend',
+        'django.contrib.auth.backends.ModelBackend',
+    ]
+
+# Rate limiting (limits per URL name live in marketplace/urls.py)
+# RATE_LIMIT_BACKEND is 'local' (per process) or 'cache' (shared through CACHES)
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'True') == 'True'
+RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'local')
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -175,7 +233,12 @@ LOGOUT_REDIRECT_URL = 'home'
 # Seedream API Configuration (ByteDance) - For Image Generation
 SEEDREAM_API_KEY = os.getenv('SEEDREAM_API_KEY', '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')
 SEEDREAM_API_BASE = os.getenv('SEEDREAM_API_BASE', 'https://openrouter.ai/api/v1')
+# Queue product images for `manage.py image_worker` instead of generating them
+# inside the request; only enable when a worker process is running
+IMAGE_JOB_QUEUE = os.getenv('IMAGE_JOB_QUEUE', 'False') == 'True'
 
 # Gemini API Configuration - For Text Generation
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', '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')
 GEMINI_API_BASE = os.getenv('GEMINI_API_BASE', 'https://openrouter.ai/api/v1')
+# 'multi' runs one completion per text section, 'structured' one JSON completion for all
+AI_TEXT_MODE = os.getenv('AI_TEXT_MODE', 'multi')
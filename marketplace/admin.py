@@ -5,6 +5,18 @@ from django.shortcuts import render, redirect
 from django.contrib import messages
 from .models import UserProfile, Category, Gig, Order, Review, Transaction, Message, BalanceRequest, CashoutRequest
 from .admin_site import admin_site
+from . import uploads
+
+
+class ImageIngestMixin:
+    """Downscale and re-encode newly uploaded images before they are stored"""
+    image_fields = {}
+
+    def save_model(self, request, obj, form, change):
+        for field, max_size in self.image_fields.items():
+            if field in form.changed_data and form.cleaned_data.get(field):
+                setattr(obj, field, uploads.ingest_upload(form.cleaned_data[field], max_size))
+        super().save_model(request, obj, form, change)
 
 
 @admin.register(Category, site=admin_site)
@@ -13,10 +25,11 @@ class CategoryAdmin(admin.ModelAdmin):
     search_fields = ['name']
 
 @admin.register(Gig, site=admin_site)
-class GigAdmin(admin.ModelAdmin):
+class GigAdmin(ImageIngestMixin, admin.ModelAdmin):
     list_display = ['title', 'seller', 'category', 'price', 'status', 'created_at']
     list_filter = ['status', 'category', 'created_at']
     search_fields = ['title', 'seller__username']
+    image_fields = {'image': uploads.GIG_IMAGE_SIZE}
 
 @admin.register(Order, site=admin_site)
 class OrderAdmin(admin.ModelAdmin):
@@ -176,10 +189,11 @@ class BalanceRequestAdmin(admin.ModelAdmin):
 
 
 @admin.register(UserProfile, site=admin_site)
-class UserProfileAdmin(admin.ModelAdmin):
+class UserProfileAdmin(ImageIngestMixin, admin.ModelAdmin):
     list_display = ['user', 'virtual_credits', 'is_seller_mode', 'created_at', 'balance_actions']
     list_filter = ['is_seller_mode', 'created_at']
     search_fields = ['user__username', 'user__email']
+    image_fields = {'profile_picture': uploads.PROFILE_PICTURE_SIZE}
     
     def balance_actions(self, obj):
         return format_html(
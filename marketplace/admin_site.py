@@ -5,6 +5,7 @@ from django.contrib import admin
 from django.contrib.auth import authenticate, login as auth_login
 from django.shortcuts import redirect
 from django.urls import reverse
+from .auth_cache import resolve_admin_user
 
 
 class SeparateSessionAdminSite(admin.AdminSite):
@@ -16,16 +17,11 @@ class SeparateSessionAdminSite(admin.AdminSite):
     
     def has_permission(self, request):
         """Check if user has admin access using separate session"""
-        admin_user_id = request.session.get('_admin_user_id')
+        user = resolve_admin_user(request)
         
-        if admin_user_id:
-            from django.contrib.auth.models import User
-            try:
-                user = User.objects.get(pk=admin_user_id)
-                request.user = user  # Attach user to request
-                return user.is_active and user.is_staff
-            except User.DoesNotExist:
-                pass
+        if user is not None:
+            request.user = user  # Attach user to request
+            return True
         
         return False
     
@@ -41,6 +37,7 @@ class SeparateSessionAdminSite(admin.AdminSite):
                 request.session['_admin_user_id'] = user.pk
                 request.session['_admin_backend'] = 'django.contrib.auth.backends.ModelBackend'
                 request.session.modified = True  # Force session save
+                request._admin_user = user
                 
                 # Get the redirect URL
                 redirect_url = request.GET.get('next', reverse('admin:index'))
@@ -55,6 +52,7 @@ class SeparateSessionAdminSite(admin.AdminSite):
             del request.session['_admin_user_id']
         if '_admin_backend' in request.session:
             del request.session['_admin_backend']
+        request._admin_user = None
         
         # Redirect to admin login
         return redirect(reverse('admin:login'))
@@ -64,14 +62,9 @@ class SeparateSessionAdminSite(admin.AdminSite):
         context = super().each_context(request)
         
         # Attach user from admin session
-        admin_user_id = request.session.get('_admin_user_id')
-        if admin_user_id:
-            from django.contrib.auth.models import User
-            try:
-                user = User.objects.get(pk=admin_user_id)
-                context['user'] = user
-            except User.DoesNotExist:
-                pass
+        user = resolve_admin_user(request)
+        if user is not None:
+            context['user'] = user
         
         return context
 
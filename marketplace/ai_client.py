@@ -0,0 +1,328 @@
+"""
+Shared HTTP client for the upstream AI API (OpenRouter).
+
+All AI calls go through one AIClient per base URL, which keeps a pooled
+keep-alive requests.Session (so repeat calls skip the TCP+TLS handshake),
+sends the standard AdEzy headers, retries connection errors, 429 and 5xx
+responses a capped number of times with jittered exponential backoff, and
+records per-call latency and token usage (see /api/ai-stats/).
+
+Read timeouts are never retried: the upstream may still be generating (and
+billing) the first request. The timeout also bounds the whole call, retries
+and backoff included, so callers with a latency budget are not held past
+it.
+
+Base URLs come from settings (GEMINI_API_BASE for text, SEEDREAM_API_BASE
+for images), so tests can point them at a local stub server.
+
+Each client keeps a CircuitBreaker per model. When most recent calls to a
+model failed or nearly timed out, the breaker opens and calls raise
+CircuitOpenError at once, so callers go straight to their fallback instead
+of waiting out the timeout. After a cool-down one probe call is let
+through (half-open); its outcome closes the breaker or re-opens it.
+"""
+import json
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+DEFAULT_MAX_RETRIES = 2
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 4.0
+
+# Circuit breaker: judge health on the last BREAKER_WINDOW calls of a model
+BREAKER_WINDOW = 20
+BREAKER_MIN_CALLS = 5
+BREAKER_FAILURE_RATE = 0.5
+# A call that used this share of its timeout counts as a failure too
+BREAKER_SLOW_CALL_SHARE = 0.8
+BREAKER_OPEN_SECONDS = 30
+
+
+class AIClientError(Exception):
+    """The upstream call failed or returned a non-200 response"""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CircuitOpenError(AIClientError):
+    """The model's circuit breaker is open; the call was not attempted"""
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open breaker over a rolling window of call
+    outcomes. Thread-safe; one instance per client and model.
+    """
+
+    def __init__(self, window=BREAKER_WINDOW, min_calls=BREAKER_MIN_CALLS,
+                 failure_rate=BREAKER_FAILURE_RATE, open_seconds=BREAKER_OPEN_SECONDS):
+        self.lock = threading.Lock()
+        self.outcomes = deque(maxlen=window)
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        self.state = 'closed'
+        self.opened_at = 0.0
+        self.probing = False
+        self.rejected = 0
+
+    def allow(self):
+        """Return True if a call may go ahead (claiming the probe when half-open)"""
+        with self.lock:
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.open_seconds:
+                self.state = 'half-open'
+            if self.state == 'closed' or (self.state == 'half-open' and not self.probing):
+                self.probing = self.state == 'half-open'
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, ok):
+        with self.lock:
+            if self.state == 'half-open':
+                # The probe decides: recovered, or back to open for another cool-down
+                self.probing = False
+                if ok:
+                    self.state = 'closed'
+                    self.outcomes.clear()
+                else:
+                    self.trip()
+                return
+            self.outcomes.append(ok)
+            failures = self.outcomes.count(False)
+            if len(self.outcomes) >= self.min_calls and failures / len(self.outcomes) >= self.failure_rate:
+                self.trip()
+
+    def trip(self):
+        self.state = 'open'
+        self.opened_at = time.monotonic()
+        self.outcomes.clear()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'state': self.state,
+                'recent_failures': self.outcomes.count(False),
+                'recent_calls': len(self.outcomes),
+                'rejected': self.rejected,
+            }
+
+
+class LatencyStats:
+    """Thread-safe per-label call counters and latency totals"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats = {}
+
+    def record(self, label, seconds, ok):
+        with self.lock:
+            entry = self.entry(label)
+            entry['count'] += 1
+            entry['errors'] += 0 if ok else 1
+            entry['total_ms'] += seconds * 1000
+            entry['max_ms'] = max(entry['max_ms'], seconds * 1000)
+
+    def record_usage(self, label, usage):
+        """Add the token counts of a completion's 'usage' block"""
+        if not isinstance(usage, dict):
+            return
+        with self.lock:
+            entry = self.entry(label)
+            entry['prompt_tokens'] += usage.get('prompt_tokens') or 0
+            entry['completion_tokens'] += usage.get('completion_tokens') or 0
+
+    def entry(self, label):
+        return self.stats.setdefault(label, {
+            'count': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+            'prompt_tokens': 0, 'completion_tokens': 0,
+        })
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                label: {
+                    'count': entry['count'],
+                    'errors': entry['errors'],
+                    'avg_ms': round(entry['total_ms'] / entry['count'], 1) if entry['count'] else 0.0,
+                    'max_ms': round(entry['max_ms'], 1),
+                    'prompt_tokens': entry['prompt_tokens'],
+                    'completion_tokens': entry['completion_tokens'],
+                }
+                for label, entry in self.stats.items()
+            }
+
+
+latency_stats = LatencyStats()
+
+
+class AIClient:
+    """Pooled client for one OpenAI-compatible API base URL"""
+
+    def __init__(self, base_url, pool_size=10):
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.breakers = {}
+        self.breakers_lock = threading.Lock()
+
+    def breaker(self, label):
+        with self.breakers_lock:
+            breaker = self.breakers.get(label)
+            if breaker is None:
+                breaker = self.breakers[label] = CircuitBreaker()
+            return breaker
+
+    def headers(self, api_key):
+        return {
+            'Authorization': f'Bearer {api_key}',
+            'HTTP-Referer': 'https://adezy.com',
+            'X-Title': 'AdEzy AI Generator',
+            'Content-Type': 'application/json'
+        }
+
+    def chat_completion(self, api_key, model, messages, timeout=30, max_retries=DEFAULT_MAX_RETRIES, **options):
+        """POST /chat/completions and return the decoded JSON body"""
+        payload = {'model': model, 'messages': messages, **options}
+        response = self.post('/chat/completions', api_key, payload, timeout, max_retries, label=model)
+        result = response.json()
+        latency_stats.record_usage(model, result.get('usage'))
+        return result
+
+    def stream_chat_completion(self, api_key, model, messages, timeout=30, max_retries=DEFAULT_MAX_RETRIES, **options):
+        """
+        POST /chat/completions with stream=True and yield the content deltas
+        as they arrive. The timeout applies to connecting and to each gap
+        between chunks.
+        """
+        payload = {'model': model, 'messages': messages, 'stream': True, **options}
+        response = self.post('/chat/completions', api_key, payload, timeout, max_retries, label=model, stream=True)
+        try:
+            for line in response.iter_lines(decode_unicode=True):
+                # Blank keep-alives and ': comment' lines carry no data
+                if not line or not line.startswith('data:'):
+                    continue
+                data = line[len('data:'):].strip()
+                if data == '[DONE]':
+                    break
+                chunk = json.loads(data)
+                if chunk.get('error'):
+                    raise AIClientError(f"{model} stream error: {chunk['error']}")
+                latency_stats.record_usage(model, chunk.get('usage'))
+                for choice in chunk.get('choices') or []:
+                    text = (choice.get('delta') or {}).get('content')
+                    if text:
+                        yield text
+        except requests.RequestException as e:
+            raise AIClientError(f"{model} stream interrupted: {e}") from e
+        finally:
+            response.close()
+
+    def post(self, path, api_key, payload, timeout, max_retries=DEFAULT_MAX_RETRIES, label=None, stream=False):
+        """
+        POST with retries; returns the 200 response or raises AIClientError
+        (CircuitOpenError, without a request, while the model's breaker is open)
+        """
+        label = label or path
+        breaker = self.breaker(label)
+        if not breaker.allow():
+            raise CircuitOpenError(f"{label} circuit open: upstream unhealthy, not calling")
+        
+        started = time.monotonic()
+        try:
+            response = self.send(path, api_key, payload, timeout, max_retries, label, stream)
+        except AIClientError as e:
+            # Client errors (bad request, bad key) say nothing about upstream health
+            status = e.status_code
+            breaker.record(ok=status is not None and 400 <= status < 500 and status != 429)
+            raise
+        except BaseException:
+            breaker.record(ok=False)
+            raise
+        breaker.record(ok=time.monotonic() - started < timeout * BREAKER_SLOW_CALL_SHARE)
+        return response
+
+    def send(self, path, api_key, payload, timeout, max_retries, label, stream):
+        deadline = time.monotonic() + timeout
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                response = self.session.post(
+                    self.base_url + path,
+                    headers=self.headers(api_key),
+                    json=payload,
+                    timeout=max(deadline - started, 0.1),
+                    stream=stream
+                )
+            except requests.ConnectionError as e:
+                # The request never reached the upstream, so it is safe to resend
+                latency_stats.record(label, time.monotonic() - started, ok=False)
+                if attempt >= max_retries:
+                    raise AIClientError(f"{label} request failed: {e}") from e
+            except requests.RequestException as e:
+                latency_stats.record(label, time.monotonic() - started, ok=False)
+                raise AIClientError(f"{label} request failed: {e}") from e
+            else:
+                ok = response.status_code == 200
+                latency_stats.record(label, time.monotonic() - started, ok=ok)
+                if ok:
+                    return response
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= max_retries:
+                    raise AIClientError(
+                        f"{label} API Error: {response.status_code}, {response.text[:500]}",
+                        status_code=response.status_code
+                    )
+                response.close()
+            
+            attempt += 1
+            # Full jitter: sleep a random time up to the exponential cap
+            delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+            if time.monotonic() + delay >= deadline:
+                raise AIClientError(f"{label} request failed: out of time after {attempt} attempts")
+            time.sleep(delay)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(base_url):
+    """Return the shared client for a base URL"""
+    with _clients_lock:
+        client = _clients.get(base_url)
+        if client is None:
+            client = _clients[base_url] = AIClient(base_url)
+        return client
+
+
+def text_client():
+    return get_client(getattr(settings, 'GEMINI_API_BASE', 'https://openrouter.ai/api/v1'))
+
+
+def image_client():
+    return get_client(getattr(settings, 'SEEDREAM_API_BASE', 'https://openrouter.ai/api/v1'))
+
+
+def breaker_states():
+    """Circuit breaker state per upstream model of every shared client"""
+    with _clients_lock:
+        clients = list(_clients.items())
+    states = {}
+    for base_url, client in clients:
+        with client.breakers_lock:
+            breakers = list(client.breakers.items())
+        for label, breaker in breakers:
+            states[f'{base_url} {label}'] = breaker.snapshot()
+    return states
@@ -0,0 +1,389 @@
+"""
+Marketing text generation for the Imagine page.
+
+Each requested section (caption, hashtags, CTA, hooks) is one chat
+completion. The sections are independent, so they are sent concurrently
+over a small shared thread pool and the pooled AI client; the whole
+request is bounded by LATENCY_BUDGET, which is also passed down as each
+call's timeout, and any section that fails or does not finish in time
+falls back to its canned text.
+
+Alternatively (mode 'structured'), one prompt asks for all selected
+sections as a single JSON object, so the product description and audience
+are sent and billed once; sections missing or malformed in the reply fall
+back individually.
+
+stream_sections() is the streaming variant used by the Imagine page: each
+section is a streaming completion, and text deltas from all sections are
+yielded as they arrive, so the first words show after the upstream's
+first-token latency rather than after the slowest section.
+
+Successful completions are cached in the 'ai_content' cache, keyed by the
+model and a hash of the normalized prompt (case and whitespace folded), so
+repeated and near-repeated requests skip the upstream call entirely.
+"""
+import concurrent.futures
+import hashlib
+import json
+import queue
+import re
+import threading
+import time
+from collections import Counter
+
+from django.core.cache import caches
+
+from .ai_client import text_client
+
+TEXT_MODEL = 'google/gemini-2.0-flash-exp:free'
+
+REQUEST_TIMEOUT = 30
+# Must stay below REQUEST_TIMEOUT to be the limit that applies
+LATENCY_BUDGET = 25
+MAX_WORKERS = 8
+CONTENT_CACHE_TTL = 60 * 60 * 24
+
+SECTIONS = ['caption', 'hashtags', 'cta', 'hooks']
+MODES = ['multi', 'structured']
+
+SECTION_PROMPTS = {
+    'caption': """Create an engaging social media caption for {platform} with these details:
+Product: {product_desc}
+Target Audience: {target_audience}
+
+Requirements:
+- Make it catchy and attention-grabbing
+- 2-3 sentences max
+- Include relevant emojis naturally
+- Focus on benefits and emotional appeal
+- Platform-appropriate tone for {platform}
+- End with a subtle call-to-action
+
+Return only the caption, nothing else.""",
+    'hashtags': """Generate relevant hashtags for this product on {platform}:
+Product: {product_desc}
+Target Audience: {target_audience}
+
+Requirements:
+- Mix of popular and niche hashtags
+- 10-15 hashtags
+- Include branded, category, and trending hashtags
+- Platform-appropriate for {platform}
+- Format: #hashtag1 #hashtag2 #hashtag3 etc.
+
+Return only the hashtags separated by spaces, nothing else.""",
+    'cta': """Create 3 powerful call-to-action lines for {platform} promoting:
+Product: {product_desc}
+Target Audience: {target_audience}
+
+Requirements:
+- Action-oriented and urgent
+- One line each (separate with line breaks)
+- Include emojis
+- Create FOMO (fear of missing out)
+- Platform-appropriate for {platform}
+
+Return only the 3 CTA lines, nothing else.""",
+    'hooks': """Create 5 attention-grabbing hook lines to start a {platform} post about:
+Product: {product_desc}
+Target Audience: {target_audience}
+
+Requirements:
+- Make people stop scrolling
+- Question-based or surprising statements
+- One line each (separate with line breaks)
+- Include emojis where appropriate
+- Curiosity-driven
+
+Return only the 5 hook lines, nothing else.""",
+}
+
+STRUCTURED_PROMPT = """Create social media marketing copy for {platform}:
+Product: {product_desc}
+Target Audience: {target_audience}
+
+Return a JSON object with exactly these keys:
+{fields}
+
+All text should be platform-appropriate for {platform}. Return only the JSON object, no markdown, nothing else."""
+
+STRUCTURED_FIELDS = {
+    'caption': '"caption": a catchy 2-3 sentence caption with natural emojis, focused on benefits and emotional appeal, ending with a subtle call-to-action',
+    'hashtags': '"hashtags": 10-15 popular, niche, branded, category and trending hashtags in one string separated by spaces (#hashtag1 #hashtag2 ...)',
+    'cta': '"cta": 3 urgent, action-oriented call-to-action lines with emojis that create FOMO, in one string separated by line breaks',
+    'hooks': '"hooks": 5 scroll-stopping, curiosity-driven hook lines (questions or surprising statements, emojis where appropriate), in one string separated by line breaks',
+}
+
+POSTER_CAPTION_PROMPT = """Create a catchy, engaging social media caption for a poster with this description: {description}
+        
+        Requirements:
+        - Make it short and punchy (2-3 sentences max)
+        - Include relevant emojis
+        - Add 3-5 relevant hashtags at the end
+        - Make it shareable and attention-grabbing
+        - Focus on benefits and call-to-action"""
+
+SECTION_FALLBACKS = {
+    'poster_caption': "Check out this amazing product! 🌟 #ad #product #amazing",
+    'caption': "Unable to generate caption at this time.",
+    'hashtags': "#marketing #business #product",
+    'cta': "🔥 Get yours now!\n💥 Limited time offer!\n✨ Don't miss out!",
+    'hooks': "🤔 Want to know a secret?\n💡 What if I told you...\n🎯 Ready to transform your life?\n⚡ This changes everything!\n🌟 You won't believe this!",
+}
+
+_executor = concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='ai-text')
+
+# Per-section cache hit/miss counters for this process
+_cache_stats = Counter()
+_cache_stats_lock = threading.Lock()
+
+
+def build_prompt(section, product_desc, target_audience, platform):
+    return SECTION_PROMPTS[section].format(
+        product_desc=product_desc,
+        target_audience=target_audience or 'general audience',
+        platform=platform
+    )
+
+
+def content_cache_key(prompt, model=TEXT_MODEL):
+    """Cache key for a prompt, insensitive to case and whitespace differences"""
+    normalized = re.sub(r'\s+', ' ', prompt).strip().lower()
+    digest = hashlib.sha256(f'{model}\n{normalized}'.encode('utf-8')).hexdigest()
+    return f'ai_text:{digest}'
+
+
+def record_cache_result(section, hit):
+    with _cache_stats_lock:
+        _cache_stats[(section, 'hit' if hit else 'miss')] += 1
+
+
+def get_cache_stats():
+    """Return {section: {'hit': n, 'miss': n}} for this process"""
+    with _cache_stats_lock:
+        stats = {}
+        for (section, outcome), count in _cache_stats.items():
+            stats.setdefault(section, {'hit': 0, 'miss': 0})[outcome] = count
+        return stats
+
+
+def request_completion(api_key, prompt, timeout=REQUEST_TIMEOUT, **options):
+    """Run one chat completion and return its text; raises on any failure"""
+    result = text_client().chat_completion(
+        api_key,
+        TEXT_MODEL,
+        [{'role': 'user', 'content': prompt}],
+        timeout=timeout,
+        **options
+    )
+    return result['choices'][0]['message']['content'].strip()
+
+
+def generate_section(api_key, section, prompt, use_cache=True, timeout=REQUEST_TIMEOUT):
+    """Return the section text from cache or upstream, or its fallback"""
+    content_cache = caches['ai_content']
+    key = content_cache_key(prompt)
+    
+    if use_cache:
+        text = content_cache.get(key)
+        record_cache_result(section, hit=text is not None)
+        if text is not None:
+            return text
+    
+    try:
+        text = request_completion(api_key, prompt, timeout=timeout)
+    except Exception as e:
+        print(f"{section.title()} generation error: {e}")
+        return SECTION_FALLBACKS[section]
+    
+    # Only real completions are cached, never fallbacks
+    content_cache.set(key, text, CONTENT_CACHE_TTL)
+    return text
+
+
+def generate_sections(api_key, sections, product_desc, target_audience, platform, budget=LATENCY_BUDGET, use_cache=True):
+    """
+    Generate the requested sections concurrently and return {section: text}.
+    Sections still running when the budget runs out get their fallback.
+    """
+    futures = {
+        section: _executor.submit(
+            generate_section, api_key, section,
+            build_prompt(section, product_desc, target_audience, platform),
+            use_cache=use_cache, timeout=min(budget, REQUEST_TIMEOUT)
+        )
+        for section in sections
+    }
+    concurrent.futures.wait(futures.values(), timeout=budget)
+    
+    content = {}
+    for section, future in futures.items():
+        if future.done():
+            content[section] = future.result()
+        else:
+            print(f"{section.title()} generation exceeded the {budget}s budget")
+            future.cancel()
+            content[section] = SECTION_FALLBACKS[section]
+    return content
+
+
+def build_structured_prompt(sections, product_desc, target_audience, platform):
+    return STRUCTURED_PROMPT.format(
+        product_desc=product_desc,
+        target_audience=target_audience or 'general audience',
+        platform=platform,
+        fields='\n'.join(f'- {STRUCTURED_FIELDS[section]}' for section in sections)
+    )
+
+
+def parse_structured_content(text, sections):
+    """
+    Parse the JSON reply of a structured prompt.
+    Tolerates markdown code fences and list values; returns
+    ({section: text}, missing) where each missing section (absent, empty
+    or of the wrong type) has been given its fallback.
+    """
+    data = {}
+    match = re.search(r'\{.*\}', text or '', re.DOTALL)
+    if match:
+        try:
+            data = json.loads(match.group(0))
+        except ValueError:
+            data = {}
+    if not isinstance(data, dict):
+        data = {}
+    
+    content = {}
+    missing = []
+    for section in sections:
+        value = data.get(section)
+        if isinstance(value, list) and all(isinstance(item, str) for item in value):
+            value = (' ' if section == 'hashtags' else '\n').join(value)
+        if isinstance(value, str) and value.strip():
+            content[section] = value.strip()
+        else:
+            content[section] = SECTION_FALLBACKS[section]
+            missing.append(section)
+    return content, missing
+
+
+def generate_sections_structured(api_key, sections, product_desc, target_audience, platform, budget=LATENCY_BUDGET, use_cache=True):
+    """
+    Generate all requested sections with one JSON-returning completion.
+    Like generate_sections, the call is bounded by the latency budget.
+    """
+    if not sections:
+        return {}
+    content_cache = caches['ai_content']
+    prompt = build_structured_prompt(sections, product_desc, target_audience, platform)
+    key = content_cache_key(prompt)
+    
+    if use_cache:
+        text = content_cache.get(key)
+        record_cache_result('structured', hit=text is not None)
+        if text is not None:
+            return parse_structured_content(text, sections)[0]
+    
+    future = _executor.submit(
+        request_completion, api_key, prompt, timeout=min(budget, REQUEST_TIMEOUT),
+        response_format={'type': 'json_object'}
+    )
+    try:
+        text = future.result(timeout=budget)
+    except concurrent.futures.TimeoutError:
+        print(f"Structured generation exceeded the {budget}s budget")
+        future.cancel()
+        return {section: SECTION_FALLBACKS[section] for section in sections}
+    except Exception as e:
+        print(f"Structured generation error: {e}")
+        return {section: SECTION_FALLBACKS[section] for section in sections}
+    
+    content, missing = parse_structured_content(text, sections)
+    if missing:
+        print(f"Structured reply missing sections: {', '.join(missing)}")
+    else:
+        # Only fully usable replies are cached
+        content_cache.set(key, text, CONTENT_CACHE_TTL)
+    return content
+
+
+def stream_completion(api_key, prompt):
+    """Yield the text deltas of one streaming chat completion"""
+    return text_client().stream_chat_completion(
+        api_key,
+        TEXT_MODEL,
+        [{'role': 'user', 'content': prompt}],
+        timeout=REQUEST_TIMEOUT
+    )
+
+
+def stream_section(api_key, section, prompt, events, cancelled):
+    """
+    Stream one section into the events queue as ('delta', section, text)
+    items, finished by one ('done', section, full_text). The 'done' text is
+    authoritative: it replaces the deltas with the fallback on failure.
+    """
+    content_cache = caches['ai_content']
+    key = content_cache_key(prompt)
+    
+    text = content_cache.get(key)
+    record_cache_result(section, hit=text is not None)
+    if text is not None:
+        events.put(('done', section, text))
+        return
+    
+    parts = []
+    try:
+        for delta in stream_completion(api_key, prompt):
+            if cancelled.is_set():
+                return
+            parts.append(delta)
+            events.put(('delta', section, delta))
+    except Exception as e:
+        print(f"{section.title()} streaming error: {e}")
+        events.put(('done', section, SECTION_FALLBACKS[section]))
+        return
+    
+    text = ''.join(parts).strip()
+    if not text:
+        events.put(('done', section, SECTION_FALLBACKS[section]))
+        return
+    content_cache.set(key, text, CONTENT_CACHE_TTL)
+    events.put(('done', section, text))
+
+
+def stream_sections(api_key, sections, product_desc, target_audience, platform, budget=LATENCY_BUDGET):
+    """
+    Stream the requested sections concurrently, yielding (event, section,
+    text) tuples in arrival order. Every section ends with exactly one
+    'done' event; sections still running when the budget runs out end
+    with their fallback.
+    """
+    events = queue.Queue()
+    cancelled = threading.Event()
+    for section in sections:
+        _executor.submit(
+            stream_section, api_key, section,
+            build_prompt(section, product_desc, target_audience, platform),
+            events, cancelled
+        )
+    
+    pending = set(sections)
+    deadline = time.monotonic() + budget
+    try:
+        while pending:
+            try:
+                event, section, text = events.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if event == 'done':
+                pending.discard(section)
+            yield event, section, text
+    finally:
+        # Also reached when the client disconnects and the generator is closed
+        cancelled.set()
+    
+    for section in sections:
+        if section in pending:
+            print(f"{section.title()} streaming exceeded the {budget}s budget")
+            yield 'done', section, SECTION_FALLBACKS[section]
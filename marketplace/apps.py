@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class MarketplaceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'marketplace'
+
+    def ready(self):
+        from django.contrib.auth.models import User
+        from django.db.models.signals import post_save, post_delete
+        from .auth_cache import invalidate_cached_user
+
+        # Drop cached User rows as soon as they change
+        post_save.connect(invalidate_cached_user, sender=User, dispatch_uid='marketplace_invalidate_cached_user')
+        post_delete.connect(invalidate_cached_user, sender=User, dispatch_uid='marketplace_invalidate_cached_user_delete')
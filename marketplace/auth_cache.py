@@ -0,0 +1,58 @@
+"""
+Caching of User lookups for authentication.
+
+Admin pages resolve the admin user from the separate `_admin_user_id`
+session key in several places (middleware, has_permission, each_context).
+resolve_admin_user() does that lookup once per request and memoizes the
+result on the request. When a shared cache is configured (CACHE_URL), the
+User row is also kept in it across requests for a short time and dropped
+whenever the User is saved or deleted. A per-process cache could only be
+invalidated in the worker that saved the User, so without CACHE_URL every
+request reads the row from the database.
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+
+USER_CACHE_TIMEOUT = 60
+
+
+def user_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def get_cached_user(user_id):
+    """Return the User with this id, from cache when possible (None if missing)"""
+    if not getattr(settings, 'CACHE_URL', ''):
+        return User.objects.filter(pk=user_id).first()
+    key = user_cache_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = User.objects.filter(pk=user_id).first()
+        if user is not None:
+            cache.set(key, user, USER_CACHE_TIMEOUT)
+    return user
+
+
+def invalidate_cached_user(sender, instance, **kwargs):
+    """post_save/post_delete receiver for User"""
+    cache.delete(user_cache_key(instance.pk))
+
+
+def resolve_admin_user(request):
+    """
+    Return the active staff user for the request's admin session, or None.
+    The result is memoized on the request so repeated checks are free.
+    """
+    if hasattr(request, '_admin_user'):
+        return request._admin_user
+    
+    user = None
+    admin_user_id = request.session.get('_admin_user_id')
+    if admin_user_id:
+        user = get_cached_user(admin_user_id)
+        if user is not None and not (user.is_active and user.is_staff):
+            user = None
+    
+    request._admin_user = user
+    return user
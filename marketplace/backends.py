@@ -0,0 +1,19 @@
+"""
+Authentication backend that serves session users from the cache.
+"""
+from django.contrib.auth.backends import ModelBackend
+
+from .auth_cache import get_cached_user
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend whose get_user() reads the User from Django's cache.
+    Together with a cache-backed session engine this makes the usual
+    authenticated poll cost no database queries. Cached rows are evicted
+    on User save/delete (see MarketplaceConfig.ready).
+    """
+
+    def get_user(self, user_id):
+        user = get_cached_user(user_id)
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,60 @@
+"""
+Gradient backgrounds for generated images (posters and the product image
+fallback).
+
+Gradients are built from Image.linear_gradient instead of one rectangle per
+row: a one-pixel-wide column is composited between the two end colours and
+stretched to the full width, which takes a few milliseconds even for a
+1080x1920 story. Finished backgrounds, including any contrast boost, are
+memoized per (style, size, contrast), so a render starts from a copy of a
+cached canvas.
+"""
+from functools import lru_cache
+
+from PIL import Image, ImageEnhance
+
+# Top and bottom colour of each vertical gradient
+GRADIENTS = {
+    'gradient': ((147, 51, 234), (59, 130, 246)),    # purple to blue
+    'wooden': ((139, 90, 43), (101, 67, 33)),        # warm brown tones
+    'marble': ((255, 255, 255), (242, 242, 234)),    # white with subtle gray
+    'white': ((255, 255, 255), (249, 249, 249)),     # clean white to light gray
+    'poster': ((255, 250, 255), (240, 200, 150)),    # soft pink to peach
+}
+DEFAULT_GRADIENT = 'white'
+
+
+def vertical_gradient(size, top, bottom):
+    """Return an RGB image of `size` fading from `top` to `bottom` colour"""
+    width, height = size
+    mask = Image.linear_gradient('L').resize((1, height), Image.Resampling.BILINEAR)
+    column = Image.composite(
+        Image.new('RGB', (1, height), bottom),
+        Image.new('RGB', (1, height), top),
+        mask
+    )
+    return column.resize((width, height), Image.Resampling.NEAREST)
+
+
+@lru_cache(maxsize=64)
+def _cached_background(style, size, contrast=1.0):
+    top, bottom = GRADIENTS.get(style, GRADIENTS[DEFAULT_GRADIENT])
+    image = vertical_gradient(size, top, bottom)
+    if contrast != 1.0:
+        image = ImageEnhance.Contrast(image).enhance(contrast)
+    return image
+
+
+def background_canvas(style, size, contrast=1.0):
+    """
+    Return a fresh copy of the memoized gradient background for a style
+    (a GRADIENTS key; anything else gets the white gradient) and size.
+    """
+    return _cached_background(style, tuple(size), contrast).copy()
+
+
+def precompute_backgrounds(sizes, styles=GRADIENTS, contrast=1.0):
+    """Warm the cache for every style and size, e.g. at worker start-up"""
+    for size in sizes:
+        for style in styles:
+            _cached_background(style, tuple(size), contrast)
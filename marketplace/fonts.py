@@ -0,0 +1,52 @@
+"""
+Process-wide font registry for generated images.
+
+get_font(family, size) resolves a family to a font file once and keeps one
+FreeTypeFont per (family, size), so renders never probe the filesystem or
+parse a font file again. Each family lists candidate files, looked up first
+in the project's FONT_DIR (static/fonts; drop .ttf files there to brand the
+output), then by name on the system. If none is found, the scalable font
+bundled with Pillow is used, so text is always sized correctly and outlines
+can use Pillow's native stroke_width.
+"""
+import os
+from functools import lru_cache
+
+from django.conf import settings
+from PIL import ImageFont
+
+FAMILIES = {
+    'display': ['Anton-Regular.ttf', 'impact.ttf', 'Impact.ttf', 'DejaVuSans-Bold.ttf', 'arialbd.ttf', 'arial.ttf'],
+    'body': ['Inter-Regular.ttf', 'arial.ttf', 'Arial.ttf', 'DejaVuSans.ttf'],
+}
+
+
+def font_dir():
+    return getattr(settings, 'FONT_DIR', os.path.join(settings.BASE_DIR, 'static', 'fonts'))
+
+
+@lru_cache(maxsize=None)
+def resolve_font_path(family):
+    """Return the first loadable font file for a family, or None"""
+    for name in FAMILIES.get(family, FAMILIES['body']):
+        bundled = os.path.join(font_dir(), name)
+        candidate = bundled if os.path.exists(bundled) else name
+        try:
+            ImageFont.truetype(candidate, 10)
+        except OSError:
+            continue
+        return candidate
+    return None
+
+
+def get_font(family, size):
+    """Return the cached FreeTypeFont for a family at a pixel size"""
+    return _load_font(family, max(int(size), 1))
+
+
+@lru_cache(maxsize=128)
+def _load_font(family, size):
+    path = resolve_font_path(family)
+    if path is None:
+        return ImageFont.load_default(size)
+    return ImageFont.truetype(path, size)
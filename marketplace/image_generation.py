@@ -0,0 +1,475 @@
+"""
+Product image generation for the Imagine page.
+
+generate_product_image() asks Seedream (through OpenRouter) for an image
+and, if no image comes back, renders a typographic placeholder with PIL.
+It is shared by the synchronous /api/generate-product-image/ endpoint and
+the background image job worker (manage.py image_worker).
+
+generate_product_image_set() produces a whole ad set (several formats and
+variations) at once. Each variation is one upstream request for a square
+master, and every format is reframed from it locally (marketplace.smartcrop),
+so a set costs one upstream call per variation rather than per format.
+Upstream requests run concurrently on threads; the CPU-bound reframing and
+fallback renders run in a process pool, so a set takes about as long as its
+slowest item.
+"""
+import base64
+import binascii
+import concurrent.futures
+import io
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import requests
+from django.core.files import File
+from PIL import Image, ImageDraw
+
+from . import backgrounds, fonts, smartcrop, storage
+from .ai_client import image_client
+
+IMAGE_MODEL = 'bytedance-seed/seedream-4.5'
+# Contrast boost baked into the cached fallback backgrounds. The white text
+# and black outlines drawn on top are already at full contrast, so boosting
+# the finished image would only cost two more full-image passes.
+FALLBACK_CONTRAST = 1.2
+
+# Media directory for generated images (content-addressed, see marketplace.storage)
+IMAGE_NAMESPACE = 'ai_images'
+
+# Upstream images (URL or data URI) are streamed to a temporary file in
+# chunks, so memory per generation stays constant whatever the image size.
+# (connect, read) timeouts for fetching a generated image URL; the read
+# timeout bounds each gap between chunks, DOWNLOAD_DEADLINE the whole body.
+DOWNLOAD_TIMEOUT = (5, 30)
+DOWNLOAD_DEADLINE = 90
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+MAX_IMAGE_BYTES = 25 * 1024 * 1024
+ALLOWED_CONTENT_TYPES = {'image/jpeg', 'image/png', 'image/webp'}
+
+# Map format to dimensions
+FORMAT_SIZES = {
+    'square': (1080, 1080),
+    'portrait': (1080, 1350),
+    'story': (1080, 1920),
+    'landscape': (1200, 628)
+}
+
+# Ad sets (/api/generate-product-images/)
+MAX_VARIATIONS = 3
+# Ad set masters are square and large enough to crop every format from
+MASTER_SIZE = (2048, 2048)
+MASTER_COMPOSITION = (
+    "This image is a master that will be cropped to 9:16, 4:5, 1:1 and 1.91:1: "
+    "keep the product and any text within the central area, with plain background around it."
+)
+UPSTREAM_WORKERS = 8
+RENDER_PROCESSES = min(4, os.cpu_count() or 1)
+
+# Map background to descriptive text
+BACKGROUND_DESCRIPTIONS = {
+    'white': 'clean white background, minimalist, professional, studio lighting',
+    'gradient': 'modern gradient background (purple to blue), vibrant colors, eye-catching, dynamic',
+    'wooden': 'rustic wooden table surface, natural wood grain texture, warm brown tones, soft natural light',
+    'marble': 'luxury white marble surface with gray veins, elegant, high-end aesthetic, pristine',
+    'lifestyle': 'realistic lifestyle setting, natural environment, authentic, in-context usage',
+    'nature': 'outdoor natural setting, lush greenery, soft sunlight, organic atmosphere',
+    'studio': 'professional photography studio, dramatic lighting, dark background, spotlight on subject'
+}
+
+
+class ImageDownloadError(Exception):
+    """The upstream image was too large, too slow or not an allowed image type"""
+
+
+def build_prompt(product_type, style, background_desc, width, height):
+    """Create highly detailed prompt for image generation"""
+    return f"""Create a high-quality, professional product photography image of: {product_type}
+
+Style & Details: {style}
+
+Background: {background_desc}
+
+Technical specifications:
+- Resolution: {width}x{height}px
+- Ultra-high quality, 8K resolution
+- Professional product photography
+- Sharp focus on the product
+- Perfect composition and framing
+- Photorealistic rendering
+- Professional color grading
+- Studio-quality lighting
+
+Composition guidelines:
+- Center the product prominently
+- Ensure the product takes up 60-70% of the frame
+- Maintain proper proportions and perspective
+- Add subtle shadows for depth
+- Include soft highlights to show texture
+- Professional product shot aesthetic
+
+If text is mentioned in the prompt, render it with:
+- Bold, sans-serif font (like Montserrat Bold or Impact)
+- White text color (#FFFFFF)
+- Thick black outline/stroke (3-4px) for contrast
+- High readability and visibility
+- Positioned according to composition rules
+- Shadow effect for depth
+
+Make the image look like a professional advertisement or social media post, ready to use immediately."""
+
+
+def request_upstream_image(api_key, prompt):
+    """
+    Ask Seedream for an image and save it. Returns the image URL, or None
+    if the upstream did not return an image.
+    """
+    name = fetch_upstream_image(api_key, prompt)
+    return storage.content_storage.url(name) if name else None
+
+
+def fetch_upstream_image(api_key, prompt):
+    """Ask Seedream for an image and save it; returns the storage name or None"""
+    # Use OpenRouter with Seedream for image generation
+    result = image_client().chat_completion(
+        api_key,
+        IMAGE_MODEL,
+        [
+            {
+                'role': 'user',
+                'content': [
+                    {
+                        'type': 'text',
+                        'text': prompt
+                    }
+                ]
+            }
+        ],
+        timeout=60,
+        max_retries=1,
+        max_tokens=1024,
+        temperature=0.7
+    )
+    
+    # Check if image was generated
+    if 'choices' in result and len(result['choices']) > 0:
+        message = result['choices'][0].get('message', {})
+        content = message.get('content')
+        
+        # Check if content is a list (multimodal response)
+        if isinstance(content, list):
+            for item in content:
+                if isinstance(item, dict) and item.get('type') == 'image_url':
+                    image_url = item.get('image_url', {}).get('url', '')
+                    if image_url:
+                        # Stream to a temporary file first, so only a complete, checked image is stored
+                        with tempfile.TemporaryFile() as buffer:
+                            if image_url.startswith('data:'):
+                                ext = decode_data_uri(image_url, buffer)
+                            else:
+                                ext = download_image(image_url, buffer)
+                            return storage.content_storage.save(f'{IMAGE_NAMESPACE}/upstream{ext}', File(buffer))
+    
+    print(f"Seedream response without image: {str(result)[:500]}")
+    return None
+
+
+def check_content_type(content_type):
+    media_type = (content_type or '').split(';')[0].strip().lower()
+    if media_type not in ALLOWED_CONTENT_TYPES:
+        raise ImageDownloadError(f"Unexpected image content type: {media_type or 'none'}")
+
+
+def sniff_image_type(head):
+    """Return the file extension for an image's leading bytes, or None"""
+    if head.startswith(b'\xff\xd8\xff'):
+        return '.jpg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return '.png'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return '.webp'
+    return None
+
+
+def write_image_chunks(chunks, destination):
+    """
+    Write chunks to `destination`, enforcing MAX_IMAGE_BYTES and checking
+    the magic bytes; returns the file extension.
+    """
+    size = 0
+    head = b''
+    for chunk in chunks:
+        size += len(chunk)
+        if size > MAX_IMAGE_BYTES:
+            raise ImageDownloadError(f"Image is larger than {MAX_IMAGE_BYTES} bytes")
+        if len(head) < 12:
+            head += chunk[:12 - len(head)]
+        destination.write(chunk)
+    
+    ext = sniff_image_type(head)
+    if ext is None:
+        raise ImageDownloadError("Upstream returned data that is not a JPEG, PNG or WebP image")
+    return ext
+
+
+def download_image(url, destination):
+    """Stream an image URL into `destination`; returns the file extension"""
+    deadline = time.monotonic() + DOWNLOAD_DEADLINE
+    with requests.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+        response.raise_for_status()
+        check_content_type(response.headers.get('Content-Type'))
+        length = response.headers.get('Content-Length', '')
+        if length.isdigit() and int(length) > MAX_IMAGE_BYTES:
+            raise ImageDownloadError(f"Image is larger than {MAX_IMAGE_BYTES} bytes")
+        
+        def chunks():
+            for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                # A trickling upstream resets the read timeout with every chunk
+                if time.monotonic() > deadline:
+                    raise ImageDownloadError(f"Image download took longer than {DOWNLOAD_DEADLINE}s")
+                yield chunk
+        
+        return write_image_chunks(chunks(), destination)
+
+
+def decode_data_uri(uri, destination):
+    """Decode a base64 data URI into `destination` in chunks; returns the file extension"""
+    header, separator, data = uri.partition(',')
+    if not separator or not header.endswith(';base64'):
+        raise ImageDownloadError("Unsupported data URI")
+    check_content_type(header[len('data:'):-len(';base64')])
+    if len(data) // 4 * 3 > MAX_IMAGE_BYTES:
+        raise ImageDownloadError(f"Image is larger than {MAX_IMAGE_BYTES} bytes")
+    
+    # Slices of a multiple of 4 characters decode independently
+    step = DOWNLOAD_CHUNK_SIZE // 3 * 4
+    try:
+        return write_image_chunks(
+            (base64.b64decode(data[start:start + step]) for start in range(0, len(data), step)),
+            destination
+        )
+    except binascii.Error as e:
+        raise ImageDownloadError(f"Invalid base64 image data: {e}") from e
+
+
+def render_fallback(product_type, style, background, width, height):
+    """Create enhanced placeholder with PIL"""
+    # Start from a copy of the cached, contrast-boosted gradient background
+    img = backgrounds.background_canvas(background, (width, height), contrast=FALLBACK_CONTRAST)
+    draw = ImageDraw.Draw(img)
+    
+    # Add decorative elements
+    if background == 'gradient':
+        # Add some circles for visual interest
+        for _ in range(3):
+            cx = random.randint(0, width)
+            cy = random.randint(0, height)
+            radius = random.randint(50, 150)
+            draw.ellipse([cx-radius, cy-radius, cx+radius, cy+radius], 
+                       fill=(255, 255, 255, 30))
+    
+    # Fonts come from the process-wide registry
+    title_font = fonts.get_font('display', height * 0.12)
+    subtitle_font = fonts.get_font('body', height * 0.05)
+    small_font = fonts.get_font('body', height * 0.03)
+    
+    # Extract text from product description if mentioned
+    main_text = product_type.upper()
+    
+    # Draw text with white fill and black outline, in one pass per string
+    # Calculate text position (center)
+    bbox = draw.textbbox((0, 0), main_text, font=title_font, stroke_width=4)
+    text_width = bbox[2] - bbox[0]
+    text_height = bbox[3] - bbox[1]
+    x = (width - text_width) // 2
+    y = (height - text_height) // 2 - int(height * 0.1)
+    draw.text((x, y), main_text, fill='#FFFFFF', font=title_font,
+              stroke_width=4, stroke_fill='#000000')
+    
+    # Add style description below
+    style_text = style[:50]
+    bbox = draw.textbbox((0, 0), style_text, font=subtitle_font, stroke_width=2)
+    text_width = bbox[2] - bbox[0]
+    x = (width - text_width) // 2
+    y = y + text_height + int(height * 0.05)
+    draw.text((x, y), style_text, fill='#FFFFFF', font=subtitle_font,
+              stroke_width=2, stroke_fill='#000000')
+    
+    # Add watermark
+    watermark = "AdEzy AI Studio"
+    bbox = draw.textbbox((0, 0), watermark, font=small_font)
+    text_width = bbox[2] - bbox[0]
+    x = width - text_width - 20
+    y = height - 40
+    draw.text((x, y), watermark, fill=(255, 255, 255, 180), font=small_font)
+    
+    return img
+
+
+def generate_product_image(api_key, product_type, style, background='white', format_type='square'):
+    """
+    Generate a product image and return {'image_url', 'prompt_used'}.
+    Falls back to a PIL placeholder when the upstream yields no image.
+    """
+    width, height = FORMAT_SIZES.get(format_type, (1080, 1080))
+    background_desc = BACKGROUND_DESCRIPTIONS.get(background, 'neutral background')
+    prompt = build_prompt(product_type, style, background_desc, width, height)
+    
+    try:
+        image_url = request_upstream_image(api_key, prompt)
+        if image_url:
+            return {'image_url': image_url, 'prompt_used': prompt}
+    except Exception as api_error:
+        print(f"API Error: {api_error}")
+    
+    # Fallback: Create enhanced placeholder with PIL
+    image_data = render_fallback_jpeg(product_type, style, background, width, height)
+    image_url = storage.save_bytes(IMAGE_NAMESPACE, image_data, '.jpg')
+    
+    return {'image_url': image_url, 'prompt_used': prompt}
+
+
+def render_fallback_jpeg(product_type, style, background, width, height):
+    """Render the PIL placeholder and return it JPEG-encoded (runs in the render pool)"""
+    buffer = io.BytesIO()
+    render_fallback(product_type, style, background, width, height).save(buffer, 'JPEG', quality=95, optimize=True)
+    return buffer.getvalue()
+
+
+_upstream_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=UPSTREAM_WORKERS, thread_name_prefix='image-upstream'
+)
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+
+def _init_render_process():
+    # Spawned processes start without Django; settings come from the environment
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def render_pool():
+    """The process pool for reframing and fallback renders, started on first use"""
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            # spawn rather than fork: forking a threaded server process is unsafe
+            _render_pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=RENDER_PROCESSES,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_render_process
+            )
+        return _render_pool
+
+
+def _reset_render_pool(pool):
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is pool:
+            _render_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def derive_formats_jpeg(master_path, sizes):
+    """Reframe a stored master to each size; returns JPEG bytes per size (runs in the render pool)"""
+    with Image.open(master_path) as master:
+        derived = smartcrop.derive_all(master, sizes)
+    encoded = []
+    for image in derived:
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', quality=95, optimize=True)
+        encoded.append(buffer.getvalue())
+    return encoded
+
+
+def _fetch_or_none(api_key, prompt):
+    try:
+        return fetch_upstream_image(api_key, prompt)
+    except Exception as api_error:
+        print(f"API Error: {api_error}")
+        return None
+
+
+def _run_in_pool(pool, func, *args):
+    """Submit func to the render pool; if the pool has broken, rebuild it and run inline"""
+    try:
+        return pool.submit(func, *args)
+    except BrokenProcessPool:
+        _reset_render_pool(pool)
+        future = concurrent.futures.Future()
+        future.set_result(func(*args))
+        return future
+
+
+def _result_or_inline(pool, future, func, *args):
+    try:
+        return future.result()
+    except BrokenProcessPool:
+        # A render process died; start a fresh pool next time and do this one inline
+        _reset_render_pool(pool)
+        return func(*args)
+
+
+def generate_product_image_set(api_key, product_type, style, background='white', formats=('square',),
+                               variations=1):
+    """
+    Generate every (format, variation) of an ad set concurrently. Returns a
+    list of {'format', 'variation', 'image_url', 'prompt_used'} in request
+    order. Each variation is one upstream master reframed to every format;
+    variations the upstream yields no image for get PIL placeholders
+    rendered natively at each format.
+    """
+    background_desc = BACKGROUND_DESCRIPTIONS.get(background, 'neutral background')
+    sizes = [FORMAT_SIZES[format_type] for format_type in formats]
+    
+    prompts = {}
+    upstream = {}
+    for variation in range(1, variations + 1):
+        prompt = build_prompt(product_type, style, background_desc, *MASTER_SIZE)
+        prompt += f"\n\n{MASTER_COMPOSITION}"
+        if variations > 1:
+            prompt += f"\n\nThis is variation {variation} of {variations}: use a distinct composition and camera angle."
+        prompts[variation] = prompt
+        upstream[_upstream_executor.submit(_fetch_or_none, api_key, prompt)] = variation
+    
+    # Start the local work for each variation as soon as its upstream request returns
+    pool = render_pool()
+    jobs = {}
+    for future in concurrent.futures.as_completed(upstream):
+        variation = upstream[future]
+        master = future.result()
+        if master:
+            # One task reframes the master to every format
+            args = (derive_formats_jpeg, storage.content_storage.path(master), sizes)
+            jobs[variation] = (True, [(_run_in_pool(pool, *args), args)])
+        else:
+            tasks = [(render_fallback_jpeg, product_type, style, background, *size) for size in sizes]
+            jobs[variation] = (False, [(_run_in_pool(pool, *args), args) for args in tasks])
+    
+    urls = {}
+    for variation, (derived, tasks) in jobs.items():
+        try:
+            results = [_result_or_inline(pool, future, *args) for future, args in tasks]
+        except Exception as render_error:
+            if not derived:
+                raise
+            # An undecodable master: fall back to placeholders for this variation
+            print(f"Could not reframe master: {render_error}")
+            derived = False
+            results = [render_fallback_jpeg(product_type, style, background, *size) for size in sizes]
+        for format_type, image_data in zip(formats, results[0] if derived else results):
+            urls[format_type, variation] = storage.save_bytes(IMAGE_NAMESPACE, image_data, '.jpg')
+    
+    return [
+        {'format': format_type, 'variation': variation, 'image_url': urls[format_type, variation],
+         'prompt_used': prompts[variation]}
+        for format_type in formats for variation in range(1, variations + 1)
+    ]
@@ -0,0 +1,105 @@
+"""
+Move cold rows out of the hot Message and Notification tables.
+
+Messages from orders that were completed or cancelled more than --days ago,
+and read notifications older than --notification-days, are copied into the
+archive tables and deleted from the hot tables in batches. Each batch is one
+transaction, so the command can be interrupted and re-run at any time.
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from marketplace.models import Message, Notification, ArchivedMessage, ArchivedNotification
+
+CLOSED_ORDER_STATUSES = ['completed', 'cancelled']
+
+
+class Command(BaseCommand):
+    help = 'Archive messages from long-closed orders and old read notifications'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90,
+                            help='Archive messages of orders closed more than this many days ago (default 90)')
+        parser.add_argument('--notification-days', type=int, default=30,
+                            help='Archive read notifications older than this many days (default 30)')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Rows moved per transaction (default 500)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report how many rows would be archived')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        batch_size = options['batch_size']
+
+        messages_qs = Message.objects.filter(
+            order__status__in=CLOSED_ORDER_STATUSES,
+            order__updated_at__lt=now - timedelta(days=options['days'])
+        )
+        notifications_qs = Notification.objects.filter(
+            is_read=True,
+            created_at__lt=now - timedelta(days=options['notification_days'])
+        )
+
+        if options['dry_run']:
+            self.stdout.write(f"Would archive {messages_qs.count()} messages and {notifications_qs.count()} notifications")
+            return
+
+        moved_messages = self.move_in_batches(messages_qs, batch_size, self.archive_messages)
+        moved_notifications = self.move_in_batches(notifications_qs, batch_size, self.archive_notifications)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {moved_messages} messages and {moved_notifications} notifications"
+        ))
+
+    def move_in_batches(self, queryset, batch_size, archive_batch):
+        """Repeatedly take the lowest ids and move them until nothing is left"""
+        total = 0
+        while True:
+            ids = list(queryset.order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            with transaction.atomic():
+                # Lock by primary key on the bare table: the candidate query
+                # joins orders, and MariaDB has no SELECT ... FOR UPDATE OF
+                rows = list(queryset.model.objects.select_for_update().filter(id__in=ids).order_by('id'))
+                if not rows:
+                    continue
+                archive_batch(rows)
+                queryset.model.objects.filter(id__in=[row.id for row in rows]).delete()
+            total += len(rows)
+            self.stdout.write(f"  moved {total} {queryset.model._meta.verbose_name_plural}")
+        return total
+
+    def archive_messages(self, rows):
+        # ignore_conflicts keeps a re-run safe if a copy already exists
+        ArchivedMessage.objects.bulk_create([
+            ArchivedMessage(
+                id=msg.id,
+                order_id=msg.order_id,
+                sender_id=msg.sender_id,
+                message=msg.message,
+                created_at=msg.created_at,
+                is_read=msg.is_read,
+            )
+            for msg in rows
+        ], ignore_conflicts=True)
+
+    def archive_notifications(self, rows):
+        ArchivedNotification.objects.bulk_create([
+            ArchivedNotification(
+                id=notif.id,
+                user_id=notif.user_id,
+                notification_type=notif.notification_type,
+                title=notif.title,
+                message=notif.message,
+                order_id=notif.order_id,
+                is_read=notif.is_read,
+                count=notif.count,
+                created_at=notif.created_at,
+                updated_at=notif.updated_at,
+            )
+            for notif in rows
+        ], ignore_conflicts=True)
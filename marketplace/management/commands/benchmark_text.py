@@ -0,0 +1,91 @@
+"""
+Compare the two text generation modes against the live upstream.
+
+Each round generates the selected sections once per-section ('multi') and
+once as a single JSON completion ('structured'), bypassing the content
+cache, and reports wall-clock latency, upstream call count and the token
+counts from the completions' usage blocks.
+"""
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from marketplace import ai_text
+from marketplace.ai_client import latency_stats
+
+
+class Command(BaseCommand):
+    help = 'Benchmark per-section vs structured AI text generation'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, default=3,
+                            help='Generations per mode (default 3)')
+        parser.add_argument('--product', default='Handmade soy candles in reusable glass jars',
+                            help='Product description to generate copy for')
+        parser.add_argument('--audience', default='eco-conscious millennials')
+        parser.add_argument('--platform', default='instagram')
+        parser.add_argument('--sections', default=','.join(ai_text.SECTIONS),
+                            help='Comma-separated sections (default all)')
+
+    def handle(self, *args, **options):
+        api_key = getattr(settings, 'GEMINI_API_KEY', None)
+        if not api_key:
+            raise CommandError('GEMINI_API_KEY is not configured')
+        sections = [s.strip() for s in options['sections'].split(',') if s.strip()]
+        unknown = set(sections) - set(ai_text.SECTIONS)
+        if unknown:
+            raise CommandError(f"Unknown sections: {', '.join(sorted(unknown))}")
+
+        generators = {
+            'multi': ai_text.generate_sections,
+            'structured': ai_text.generate_sections_structured,
+        }
+        results = {}
+        for mode, generate in generators.items():
+            results[mode] = self.run_mode(generate, api_key, sections, options)
+
+        for mode, result in results.items():
+            self.stdout.write(
+                f"{mode:<11} p50 {result['p50_ms']:>8.0f} ms  max {result['max_ms']:>8.0f} ms  "
+                f"calls {result['calls']:>3}  errors {result['errors']:>2}  "
+                f"prompt tokens {result['prompt_tokens']:>6}  completion tokens {result['completion_tokens']:>6}  "
+                f"fallback sections {result['fallbacks']}"
+            )
+
+        multi, structured = results['multi'], results['structured']
+        if multi['p50_ms']:
+            self.stdout.write(self.style.SUCCESS(
+                f"structured vs multi: p50 latency {100 * (structured['p50_ms'] / multi['p50_ms'] - 1):+.0f}%, "
+                f"calls {structured['calls'] - multi['calls']:+d}, "
+                f"tokens {self.total_tokens(structured) - self.total_tokens(multi):+d}"
+            ))
+
+    def run_mode(self, generate, api_key, sections, options):
+        before = latency_stats.snapshot().get(ai_text.TEXT_MODEL, {})
+        timings = []
+        fallbacks = 0
+        for _ in range(options['rounds']):
+            started = time.monotonic()
+            content = generate(api_key, sections, options['product'], options['audience'],
+                               options['platform'], use_cache=False)
+            timings.append((time.monotonic() - started) * 1000)
+            fallbacks += sum(1 for s in sections if content[s] == ai_text.SECTION_FALLBACKS[s])
+        after = latency_stats.snapshot().get(ai_text.TEXT_MODEL, {})
+
+        def delta(field):
+            return after.get(field, 0) - before.get(field, 0)
+
+        return {
+            'p50_ms': statistics.median(timings) if timings else 0,
+            'max_ms': max(timings, default=0),
+            'calls': delta('count'),
+            'errors': delta('errors'),
+            'prompt_tokens': delta('prompt_tokens'),
+            'completion_tokens': delta('completion_tokens'),
+            'fallbacks': fallbacks,
+        }
+
+    def total_tokens(self, result):
+        return result['prompt_tokens'] + result['completion_tokens']
@@ -0,0 +1,116 @@
+"""
+Delete media files that nothing references any more.
+
+MEDIA_ROOT is walked with os.scandir. Uploaded files (gig images, profile
+pictures, ...) are kept while a row in models.MEDIA_FIELDS references them.
+Generated posters and product images are never referenced by a row; the
+page that requested them only shows the URL, so they are kept for
+--generated-days after their last save. Everything else is deleted in
+batches, re-checking references just before each batch. The command is
+safe to run from cron and to interrupt.
+"""
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from marketplace import image_generation, posters
+from marketplace.models import MEDIA_FIELDS
+
+GENERATED_NAMESPACES = {posters.POSTER_NAMESPACE, image_generation.IMAGE_NAMESPACE}
+
+
+def walk_files(root):
+    """Yield (name relative to root, path, stat) for every regular file under root"""
+    pending = [root]
+    while pending:
+        directory = pending.pop()
+        try:
+            entries = list(os.scandir(directory))
+        except FileNotFoundError:
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                pending.append(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                name = os.path.relpath(entry.path, root).replace(os.sep, '/')
+                yield name, entry.path, entry.stat(follow_symlinks=False)
+
+
+def referenced_names(names=None):
+    """Media names referenced by any row, optionally restricted to `names`"""
+    referenced = set()
+    for model, field in MEDIA_FIELDS:
+        queryset = model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+        if names is not None:
+            queryset = queryset.filter(**{f'{field}__in': names})
+        referenced.update(queryset.values_list(field, flat=True).iterator())
+    return referenced
+
+
+class Command(BaseCommand):
+    help = 'Delete unreferenced uploads and expired generated images from MEDIA_ROOT'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--generated-days', type=int, default=7,
+                            help='Keep generated posters and product images this many days (default 7)')
+        parser.add_argument('--grace-hours', type=int, default=1,
+                            help='Never delete uploads younger than this, e.g. mid-request (default 1)')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Files deleted per batch (default 500)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report what would be deleted')
+
+    def handle(self, *args, **options):
+        root = str(settings.MEDIA_ROOT)
+        now = time.time()
+        generated_cutoff = now - options['generated_days'] * 86400
+        upload_cutoff = now - options['grace_hours'] * 3600
+        referenced = referenced_names()
+
+        kept = removed = reclaimed = 0
+        batch = []
+        for name, path, stat in walk_files(root):
+            generated = name.split('/', 1)[0] in GENERATED_NAMESPACES
+            cutoff = generated_cutoff if generated else upload_cutoff
+            if stat.st_mtime >= cutoff or name in referenced:
+                kept += 1
+                continue
+            batch.append((name, path, stat.st_size, cutoff))
+            if len(batch) >= options['batch_size']:
+                count, size = self.delete_batch(batch, options['dry_run'])
+                removed, reclaimed = removed + count, reclaimed + size
+                kept += len(batch) - count
+                batch = []
+        if batch:
+            count, size = self.delete_batch(batch, options['dry_run'])
+            removed, reclaimed = removed + count, reclaimed + size
+            kept += len(batch) - count
+
+        verb = 'Would remove' if options['dry_run'] else 'Removed'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {removed} files ({reclaimed / (1024 * 1024):.1f} MB), kept {kept}"
+        ))
+
+    def delete_batch(self, batch, dry_run):
+        """Delete a batch of candidates that are still unreferenced; returns (files, bytes)"""
+        # Rows saved since the walk started may reference a candidate by now
+        still_referenced = referenced_names([name for name, _, _, _ in batch])
+        count = size = 0
+        for name, path, file_size, cutoff in batch:
+            if name in still_referenced:
+                continue
+            if not dry_run:
+                try:
+                    # A deduplicated save touches the blob it reuses
+                    if os.stat(path).st_mtime >= cutoff:
+                        continue
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+            count += 1
+            size += file_size
+        if not dry_run:
+            self.stdout.write(f"  removed {count} files")
+        return count, size
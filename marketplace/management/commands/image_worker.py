@@ -0,0 +1,132 @@
+"""
+Process queued product image jobs (ImageGenerationJob).
+
+Jobs are claimed with a conditional UPDATE (queued -> running), so any
+number of workers can run side by side, and each worker runs at most
+--concurrency generations at a time. Claiming a job counts an attempt.
+Jobs left 'running' by a worker that died or hung are re-queued after
+--stale-after seconds, or failed once they have used --max-attempts. A
+run only writes its result while it still owns the job (same status and
+started_at), so a superseded run cannot overwrite the newer one.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+
+from marketplace import backgrounds, image_generation
+from marketplace.models import ImageGenerationJob
+
+
+class Command(BaseCommand):
+    help = 'Run the background worker for queued product image jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=2,
+                            help='Maximum jobs processed at once (default 2)')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait when the queue is empty (default 1)')
+        parser.add_argument('--stale-after', type=int, default=300,
+                            help='Re-queue jobs running longer than this many seconds (default 300)')
+        parser.add_argument('--max-attempts', type=int, default=3,
+                            help='Give up on a job after this many attempts (default 3)')
+        parser.add_argument('--once', action='store_true',
+                            help='Process the jobs currently queued, then exit')
+
+    def handle(self, *args, **options):
+        concurrency = options['concurrency']
+        self.max_attempts = options['max_attempts']
+        in_flight = set()
+
+        # Build every fallback background once up front
+        backgrounds.precompute_backgrounds(
+            image_generation.FORMAT_SIZES.values(),
+            contrast=image_generation.FALLBACK_CONTRAST
+        )
+        self.stdout.write(f"Image worker started (concurrency {concurrency})")
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='image-job') as executor:
+            while True:
+                in_flight = {future for future in in_flight if not future.done()}
+
+                claimed = False
+                while len(in_flight) < concurrency:
+                    job = self.claim_job()
+                    if job is None:
+                        break
+                    claimed = True
+                    in_flight.add(executor.submit(self.run_job, job))
+
+                if not claimed and not in_flight and options['once']:
+                    break
+                if not claimed:
+                    self.requeue_stale_jobs(options['stale_after'])
+                    time.sleep(options['poll_interval'])
+
+    def claim_job(self):
+        """Atomically move the oldest queued job to 'running'; None if the queue is empty"""
+        for job_id in ImageGenerationJob.objects.filter(status='queued').order_by('id').values_list('id', flat=True)[:10]:
+            won = ImageGenerationJob.objects.filter(id=job_id, status='queued').update(
+                status='running',
+                started_at=timezone.now(),
+                attempts=F('attempts') + 1
+            )
+            if won:
+                return ImageGenerationJob.objects.get(id=job_id)
+        return None
+
+    def requeue_stale_jobs(self, stale_after):
+        stale = ImageGenerationJob.objects.filter(
+            status='running',
+            started_at__lt=timezone.now() - timedelta(seconds=stale_after)
+        )
+        stale.filter(attempts__gte=self.max_attempts).update(
+            status='failed',
+            error='Timed out',
+            finished_at=timezone.now()
+        )
+        stale.filter(attempts__lt=self.max_attempts).update(status='queued')
+
+    def run_job(self, job):
+        try:
+            self.process_job(job)
+        finally:
+            # Worker threads must not keep their own DB connections open
+            connection.close()
+
+    def process_job(self, job):
+        params = job.params
+        try:
+            result = image_generation.generate_product_image(
+                getattr(settings, 'SEEDREAM_API_KEY', None),
+                params.get('product_type', ''),
+                params.get('style', ''),
+                params.get('background', 'white'),
+                params.get('format', 'square')
+            )
+            fields = {
+                'status': 'done',
+                'result_url': result['image_url'],
+                'prompt_used': result['prompt_used'],
+                'error': '',
+                'finished_at': timezone.now(),
+            }
+        except Exception as e:
+            fields = {'error': str(e)}
+            if job.attempts >= self.max_attempts:
+                fields.update(status='failed', finished_at=timezone.now())
+            else:
+                fields['status'] = 'queued'
+            self.stderr.write(f"  job #{job.id} failed (attempt {job.attempts}): {e}")
+        
+        owned = ImageGenerationJob.objects.filter(
+            id=job.id, status='running', started_at=job.started_at
+        ).update(**fields)
+        if not owned:
+            self.stderr.write(f"  job #{job.id} was re-queued while running; result discarded")
+        elif fields['status'] == 'done':
+            self.stdout.write(f"  job #{job.id} done")
@@ -1,8 +1,15 @@
 """
-Middleware to separate admin and regular user sessions
+Middleware to separate admin and regular user sessions, and to rate-limit
+expensive and polling endpoints
 """
+import math
+
+from django.conf import settings
 from django.contrib.auth import login, logout
-from django.contrib.auth.models import User, AnonymousUser
+from django.contrib.auth.models import AnonymousUser
+from django.http import JsonResponse
+from .auth_cache import resolve_admin_user
+from .ratelimit import parse_rate, get_bucket_store, client_key
 
 
 class SeparateAdminSessionMiddleware:
@@ -33,19 +40,14 @@ class SeparateAdminSessionMiddleware:
         admin_user_id = request.session.get('_admin_user_id')
         
         if admin_user_id:
-            try:
-                user = User.objects.get(pk=admin_user_id)
-                if user.is_active and user.is_staff:
-                    # Override the request.user with admin user
-                    request.user = user
-                    request._cached_user = user
-                else:
-                    # Invalid admin session
-                    if '_admin_user_id' in request.session:
-                        del request.session['_admin_user_id']
-                    request.user = AnonymousUser()
-            except User.DoesNotExist:
-                # User doesn't exist, clear session
+            # Resolved once per request and shared with the admin site
+            user = resolve_admin_user(request)
+            if user is not None:
+                # Override the request.user with admin user
+                request.user = user
+                request._cached_user = user
+            else:
+                # Invalid admin session (user missing, inactive or not staff)
                 if '_admin_user_id' in request.session:
                     del request.session['_admin_user_id']
                 request.user = AnonymousUser()
@@ -70,3 +72,42 @@ class SeparateAdminSessionMiddleware:
     def _save_regular_session(self, request):
         """Regular session is handled by default Django auth"""
         pass
+
+
+class RateLimitMiddleware:
+    """
+    Per-user / per-IP token-bucket rate limiting for the URL names listed in
+    marketplace.urls.RATE_LIMITS. Over-limit requests get a 429 response
+    with a Retry-After header.
+    """
+    
+    def __init__(self, get_response):
+        from .urls import RATE_LIMITS
+        
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'RATE_LIMIT_ENABLED', True)
+        self.limits = {name: parse_rate(rate) for name, rate in RATE_LIMITS.items()}
+        self.store = get_bucket_store(getattr(settings, 'RATE_LIMIT_BACKEND', 'local'))
+    
+    def __call__(self, request):
+        return self.get_response(request)
+    
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not self.enabled:
+            return None
+        
+        url_name = request.resolver_match.url_name if request.resolver_match else None
+        if url_name not in self.limits:
+            return None
+        
+        capacity, period = self.limits[url_name]
+        allowed, retry_after = self.store.hit(f'{url_name}:{client_key(request)}', capacity, period)
+        if allowed:
+            return None
+        
+        response = JsonResponse({
+            'success': False,
+            'error': 'Too many requests. Please slow down and try again shortly.'
+        }, status=429)
+        response['Retry-After'] = str(max(1, math.ceil(retry_after)))
+        return response
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0006_gig_is_featured_gig_rating_gig_total_orders_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['order', 'id'], name='marketplace_order_i_91549e_idx'),
+        ),
+    ]
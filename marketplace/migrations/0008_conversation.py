@@ -0,0 +1,57 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:38
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_conversations(apps, schema_editor):
+    """Build summaries for orders that already have messages"""
+    Order = apps.get_model('marketplace', 'Order')
+    Message = apps.get_model('marketplace', 'Message')
+    Conversation = apps.get_model('marketplace', 'Conversation')
+
+    for order in Order.objects.filter(messages__isnull=False).distinct().iterator():
+        last_message = Message.objects.filter(order=order).order_by('-id').first()
+        unread = Message.objects.filter(order=order, is_read=False)
+        text = last_message.message
+        Conversation.objects.create(
+            order=order,
+            buyer_id=order.buyer_id,
+            seller_id=order.seller_id,
+            last_message=last_message,
+            last_message_snippet=text[:50] + ('...' if len(text) > 50 else ''),
+            last_message_at=last_message.created_at,
+            buyer_unread=unread.exclude(sender_id=order.buyer_id).count(),
+            seller_unread=unread.exclude(sender_id=order.seller_id).count(),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('marketplace', '0007_message_order_id_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_message_snippet', models.CharField(blank=True, max_length=60)),
+                ('last_message_at', models.DateTimeField()),
+                ('buyer_unread', models.IntegerField(default=0)),
+                ('seller_unread', models.IntegerField(default=0)),
+                ('buyer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='buyer_conversations', to=settings.AUTH_USER_MODEL)),
+                ('last_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='marketplace.message')),
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='conversation', to='marketplace.order')),
+                ('seller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seller_conversations', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-last_message_at'],
+                'indexes': [models.Index(fields=['buyer', '-last_message_at'], name='marketplace_buyer_i_f2d421_idx'), models.Index(fields=['seller', '-last_message_at'], name='marketplace_seller__c80c04_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_conversations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:39
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import re
+from collections import Counter
+
+
+def backfill_search_tokens(apps, schema_editor):
+    """Index messages that were sent before search existed"""
+    Message = apps.get_model('marketplace', 'Message')
+    MessageSearchToken = apps.get_model('marketplace', 'MessageSearchToken')
+    token_re = re.compile(r'\w+', re.UNICODE)
+
+    batch = []
+    for message in Message.objects.select_related('order').iterator():
+        counts = Counter(
+            token for token in token_re.findall(message.message.lower())
+            if 2 <= len(token) <= 40
+        )
+        for user_id in {message.order.buyer_id, message.order.seller_id}:
+            for token, weight in counts.items():
+                batch.append(MessageSearchToken(user_id=user_id, token=token, message=message, weight=min(weight, 32767)))
+        if len(batch) >= 1000:
+            MessageSearchToken.objects.bulk_create(batch)
+            batch = []
+    MessageSearchToken.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('marketplace', '0008_conversation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=40)),
+                ('weight', models.PositiveSmallIntegerField(default=1, help_text='Occurrences of the token in the message')),
+                ('message', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='marketplace.message')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'token'], name='marketplace_user_id_5acc2c_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_search_tokens, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:11
+
+from django.db import migrations, models
+import marketplace.uploads
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0012_imagegenerationjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='gig',
+            name='image',
+            field=models.ImageField(blank=True, null=True, upload_to='gigs/', validators=[marketplace.uploads.validate_image_upload]),
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='profile_picture',
+            field=models.ImageField(blank=True, null=True, upload_to='profiles/', validators=[marketplace.uploads.validate_image_upload]),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:13
+
+from django.db import migrations, models
+import marketplace.storage
+import marketplace.uploads
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0013_image_upload_validators'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='gig',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=marketplace.storage.media_storage, upload_to='gigs/', validators=[marketplace.uploads.validate_image_upload]),
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='profile_picture',
+            field=models.ImageField(blank=True, null=True, storage=marketplace.storage.media_storage, upload_to='profiles/', validators=[marketplace.uploads.validate_image_upload]),
+        ),
+    ]
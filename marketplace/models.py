@@ -1,6 +1,10 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
+from django.db.models.functions import Greatest
+
+from .storage import media_storage
+from .uploads import validate_image_upload
 
 class UserProfile(models.Model):
     """Extended user profile with buyer/seller switching capability"""
@@ -13,7 +17,10 @@ class UserProfile(models.Model):
     )
     is_seller_mode = models.BooleanField(default=False)
     bio = models.TextField(blank=True, null=True)
-    profile_picture = models.ImageField(upload_to='profiles/', blank=True, null=True)
+    profile_picture = models.ImageField(
+        upload_to='profiles/', storage=media_storage, blank=True, null=True,
+        validators=[validate_image_upload]
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -58,7 +65,10 @@ class Gig(models.Model):
         validators=[MinValueValidator(1)]
     )
     delivery_time = models.IntegerField(help_text="Delivery time in days")
-    image = models.ImageField(upload_to='gigs/', blank=True, null=True)
+    image = models.ImageField(
+        upload_to='gigs/', storage=media_storage, blank=True, null=True,
+        validators=[validate_image_upload]
+    )
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active')
     rating = models.DecimalField(
         max_digits=3, 
@@ -163,6 +173,97 @@ class Message(models.Model):
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['order', 'id']),
+        ]
+
+
+class MessageSearchToken(models.Model):
+    """Inverted index entry for message search: one row per (participant, token, message)"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    token = models.CharField(max_length=40)
+    message = models.ForeignKey(Message, on_delete=models.CASCADE, related_name='search_tokens')
+    weight = models.PositiveSmallIntegerField(default=1, help_text="Occurrences of the token in the message")
+
+    def __str__(self):
+        return f"{self.token} -> Message #{self.message_id}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'token']),
+        ]
+
+
+class Conversation(models.Model):
+    """Denormalized per-order summary of the message thread, used by the inbox"""
+    SNIPPET_LENGTH = 50
+
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='conversation')
+    buyer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='buyer_conversations')
+    seller = models.ForeignKey(User, on_delete=models.CASCADE, related_name='seller_conversations')
+    last_message = models.ForeignKey(
+        Message,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    last_message_snippet = models.CharField(max_length=60, blank=True)
+    last_message_at = models.DateTimeField()
+    buyer_unread = models.IntegerField(default=0)
+    seller_unread = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"Conversation on Order #{self.order_id}"
+
+    @classmethod
+    def make_snippet(cls, text):
+        return text[:cls.SNIPPET_LENGTH] + ('...' if len(text) > cls.SNIPPET_LENGTH else '')
+
+    @classmethod
+    def record_message(cls, message):
+        """Update the summary for a newly sent message (call inside a transaction)"""
+        order = message.order
+        unread_field = 'seller_unread' if message.sender_id == order.buyer_id else 'buyer_unread'
+
+        conversation, created = cls.objects.select_for_update().get_or_create(
+            order=order,
+            defaults={
+                'buyer_id': order.buyer_id,
+                'seller_id': order.seller_id,
+                'last_message': message,
+                'last_message_snippet': cls.make_snippet(message.message),
+                'last_message_at': message.created_at,
+                unread_field: 1,
+            }
+        )
+        if not created:
+            cls.objects.filter(pk=conversation.pk).update(
+                last_message=message,
+                last_message_snippet=cls.make_snippet(message.message),
+                last_message_at=message.created_at,
+                **{unread_field: models.F(unread_field) + 1}
+            )
+
+    @classmethod
+    def record_read(cls, order, reader, count):
+        """Decrease the reader's unread counter after `count` messages were marked read"""
+        if not count:
+            return
+        unread_field = 'buyer_unread' if reader.id == order.buyer_id else 'seller_unread'
+        cls.objects.filter(order=order).update(**{
+            unread_field: Greatest(models.F(unread_field) - count, 0)
+        })
+
+    def unread_for(self, user):
+        return self.buyer_unread if user.id == self.buyer_id else self.seller_unread
+
+    class Meta:
+        ordering = ['-last_message_at']
+        indexes = [
+            models.Index(fields=['buyer', '-last_message_at']),
+            models.Index(fields=['seller', '-last_message_at']),
+        ]
 
 
 class Notification(models.Model):
@@ -183,15 +284,20 @@ class Notification(models.Model):
     message = models.TextField()
     order = models.ForeignKey(Order, on_delete=models.CASCADE, null=True, blank=True)
     is_read = models.BooleanField(default=False)
+    group_key = models.CharField(max_length=100, blank=True, help_text="Unread notifications with the same key are coalesced")
+    count = models.PositiveIntegerField(default=1, help_text="Number of events coalesced into this notification")
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.notification_type} for {self.user.username}"
 
     class Meta:
-        ordering = ['-created_at']
+        ordering = ['-updated_at']
         indexes = [
             models.Index(fields=['user', 'is_read']),
+            models.Index(fields=['user', '-updated_at']),
+            models.Index(fields=['user', 'group_key']),
         ]
 
 
@@ -267,3 +373,91 @@ class CashoutRequest(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Cashout Request'
         verbose_name_plural = 'Cashout Requests'
+
+
+class ArchivedMessage(models.Model):
+    """Cold-storage copy of a message from a long-closed order (keeps the original id)"""
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='archived_messages')
+    sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    message = models.TextField()
+    created_at = models.DateTimeField()
+    is_read = models.BooleanField(default=False)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Archived message #{self.id} on Order #{self.order_id}"
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['order', 'id']),
+        ]
+
+
+class ArchivedNotification(models.Model):
+    """Cold-storage copy of an old, read notification (keeps the original id)"""
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    notification_type = models.CharField(max_length=20, choices=Notification.NOTIFICATION_TYPES)
+    title = models.CharField(max_length=200)
+    message = models.TextField()
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    is_read = models.BooleanField(default=True)
+    count = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Archived {self.notification_type} for user #{self.user_id}"
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+        ]
+
+
+class ImageGenerationJob(models.Model):
+    """Queued product image generation, processed by `manage.py image_worker`"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='image_jobs')
+    params = models.JSONField(help_text="product_type, style, background and format")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    result_url = models.CharField(max_length=500, blank=True)
+    prompt_used = models.TextField(blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Image job #{self.id} ({self.status}) for {self.user.username}"
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'id']),
+        ]
+
+
+# File fields whose names reference blobs in MEDIA_ROOT. Blobs are shared
+# between rows with identical content (see marketplace.storage), so a file
+# may only be deleted once no row references it; `manage.py gc_media`
+# collects the rest.
+MEDIA_FIELDS = [
+    (Gig, 'image'),
+    (UserProfile, 'profile_picture'),
+]
+
+
+def media_is_referenced(name):
+    return any(model.objects.filter(**{field: name}).exists() for model, field in MEDIA_FIELDS)
@@ -0,0 +1,120 @@
+"""
+Notification helpers with a cached per-user unread counter.
+
+When a shared cache is configured (CACHE_URL), the counter lives in it and
+is adjusted in place whenever a notification is created or read, so the
+5-second notification poll can answer the unread count without a COUNT
+query. On a cache miss the count is recomputed from the (user, is_read)
+index and stored again. Per-process caches would let workers disagree, so
+without CACHE_URL every poll counts from the index instead.
+
+Bursts of similar events (e.g. many chat messages on one order) are
+coalesced: while an unread notification with the same group key was
+updated within COALESCE_WINDOW, the new event bumps its counter instead
+of inserting another row.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Notification
+
+UNREAD_COUNT_TIMEOUT = 300
+COALESCE_WINDOW = timedelta(minutes=30)
+
+
+def unread_count_key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def counter_cached():
+    return bool(getattr(settings, 'CACHE_URL', ''))
+
+
+def get_unread_count(user):
+    """Return the user's unread notification count, from cache when possible"""
+    if not counter_cached():
+        return Notification.objects.filter(user=user, is_read=False).count()
+    key = unread_count_key(user.id)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(user=user, is_read=False).count()
+        cache.set(key, count, UNREAD_COUNT_TIMEOUT)
+    return count
+
+
+def _adjust_unread_count(user_id, delta):
+    if not counter_cached():
+        return
+    key = unread_count_key(user_id)
+    try:
+        if delta > 0:
+            cache.incr(key, delta)
+        else:
+            cache.decr(key, -delta)
+    except ValueError:
+        # Not cached yet; the next read recomputes it
+        pass
+
+
+def group_key_for(notification_type, order=None):
+    return f'{notification_type}:{order.id if order else ""}'
+
+
+def notify(user, notification_type, title, message, order=None, coalesce=False):
+    """
+    Create a notification and bump the recipient's unread counter.
+    With coalesce=True, an unread notification of the same type for the same
+    order that was updated recently is updated in place instead; it returns
+    None in that case since no new row was written.
+    """
+    group_key = group_key_for(notification_type, order)
+    
+    if coalesce:
+        # UPDATE-then-INSERT upsert on the (user, group_key) index
+        updated = Notification.objects.filter(
+            user=user,
+            group_key=group_key,
+            is_read=False,
+            updated_at__gte=timezone.now() - COALESCE_WINDOW
+        ).update(
+            count=F('count') + 1,
+            title=title,
+            message=message,
+            updated_at=timezone.now()
+        )
+        if updated:
+            # Still one unread notification, so the counter is unchanged
+            return None
+    
+    notification = Notification.objects.create(
+        user=user,
+        notification_type=notification_type,
+        title=title,
+        message=message,
+        order=order,
+        group_key=group_key
+    )
+    # Only count it once the surrounding transaction (if any) has committed
+    transaction.on_commit(lambda: _adjust_unread_count(user.id, 1))
+    return notification
+
+
+def mark_read(user, notification_id):
+    """Mark one of the user's notifications as read; raises Notification.DoesNotExist"""
+    updated = Notification.objects.filter(id=notification_id, user=user, is_read=False).update(is_read=True)
+    if updated:
+        _adjust_unread_count(user.id, -updated)
+    elif not Notification.objects.filter(id=notification_id, user=user).exists():
+        raise Notification.DoesNotExist
+
+
+def mark_all_read(user):
+    """Mark all of the user's notifications as read"""
+    Notification.objects.filter(user=user, is_read=False).update(is_read=True)
+    if counter_cached():
+        cache.set(unread_count_key(user.id), 0, UNREAD_COUNT_TIMEOUT)
@@ -0,0 +1,193 @@
+"""
+Layered poster rendering for /api/generate-poster/.
+
+A template is a list of layers in z-order. Static layers (background,
+banner) do not depend on the request, so each run of consecutive static
+layers is flattened once per (template, size) and cached: the bottom run
+becomes the base canvas, later runs become RGBA overlays. Per poster only
+the dynamic layers are drawn: drop shadow (a blurred rectangle), product,
+logo and text. A classic poster therefore costs a copy of the cached base,
+one product resize, one shadow blur and a few composites.
+
+The shadow is not cached: it is sized to each product cutout, so almost
+every upload would be a miss holding a multi-megabyte RGBA image.
+
+Layer boxes are (x, y, width, height) as fractions of the canvas.
+"""
+from functools import lru_cache
+
+from PIL import Image, ImageDraw, ImageFilter
+
+from . import backgrounds, fonts
+
+POSTER_SIZE = (1080, 1080)
+# Media directory for rendered posters (content-addressed, see marketplace.storage)
+POSTER_NAMESPACE = 'posters'
+# Largest logo any template draws, so uploads are decoded no bigger than this
+LOGO_INPUT_SIZE = (300, 300)
+BANNER_COLOR = (16, 24, 40)
+
+TEMPLATES = {
+    # The original AdEzy layout: dark banners top and bottom, product centred
+    'classic': [
+        {'type': 'background', 'style': 'poster'},
+        {'type': 'banner', 'box': (0, 0, 1, 0.093), 'fill': BANNER_COLOR},
+        {'type': 'banner', 'box': (0, 0.907, 1, 0.093), 'fill': BANNER_COLOR},
+        {'type': 'shadow', 'offset': (10, 10), 'blur': 20, 'opacity': 100},
+        {'type': 'product', 'box': (0.1, 0.104, 0.8, 0.7)},
+        {'type': 'logo', 'anchor': 'top-right', 'size': 150, 'margin': 40},
+    ],
+    # Clean white canvas, bigger product and the description underneath
+    'minimal': [
+        {'type': 'background', 'style': 'white'},
+        {'type': 'shadow', 'offset': (0, 12), 'blur': 30, 'opacity': 60},
+        {'type': 'product', 'box': (0.075, 0.06, 0.85, 0.72)},
+        {'type': 'logo', 'anchor': 'top-left', 'size': 120, 'margin': 32},
+        {'type': 'text', 'box': (0.05, 0.82, 0.9, 0.14), 'family': 'body', 'size': 0.045,
+         'fill': (17, 24, 39), 'max_chars': 80},
+    ],
+    # Vibrant gradient with a caption band over the bottom of the product
+    'bold': [
+        {'type': 'background', 'style': 'gradient'},
+        {'type': 'shadow', 'offset': (16, 16), 'blur': 24, 'opacity': 120},
+        {'type': 'product', 'box': (0.12, 0.08, 0.76, 0.66)},
+        {'type': 'banner', 'box': (0, 0.76, 1, 0.24), 'fill': (0, 0, 0, 150)},
+        {'type': 'logo', 'anchor': 'top-right', 'size': 140, 'margin': 36},
+        {'type': 'text', 'box': (0.05, 0.79, 0.9, 0.18), 'family': 'display', 'size': 0.07,
+         'fill': (255, 255, 255), 'stroke': 3, 'max_chars': 40, 'upper': True},
+    ],
+}
+DEFAULT_TEMPLATE = 'classic'
+STATIC_LAYERS = {'background', 'banner'}
+
+
+def pixel_box(box, size):
+    width, height = size
+    x, y, w, h = box
+    return int(x * width), int(y * height), int(w * width), int(h * height)
+
+
+def draw_static_layer(image, layer):
+    if layer['type'] == 'background':
+        image.paste(backgrounds.background_canvas(layer['style'], image.size).convert(image.mode))
+    elif layer['type'] == 'banner':
+        x, y, w, h = pixel_box(layer['box'], image.size)
+        fill = tuple(layer['fill'])
+        if len(fill) == 3:
+            fill += (255,)
+        band = Image.new('RGBA', (w, h), fill)
+        if image.mode == 'RGBA':
+            image.alpha_composite(band, (x, y))
+        else:
+            image.paste(band, (x, y), band)
+
+
+@lru_cache(maxsize=32)
+def _static_runs(template, size):
+    """
+    Flatten each run of static layers. Returns a list of (index, image)
+    where index is the position of the run in the template; the first
+    run is an RGB base when the template starts with static layers.
+    """
+    runs = []
+    current = None
+    for index, layer in enumerate(TEMPLATES[template]):
+        if layer['type'] not in STATIC_LAYERS:
+            current = None
+            continue
+        if current is None:
+            mode, color = ('RGB', '#ffffff') if index == 0 else ('RGBA', (0, 0, 0, 0))
+            current = Image.new(mode, size, color)
+            runs.append((index, current))
+        draw_static_layer(current, layer)
+    return runs
+
+
+def _shadow(size, blur, opacity):
+    """Blurred rectangle shadow for a product of `size`, padded by the blur radius"""
+    pad = blur * 2
+    shadow = Image.new('RGBA', (size[0] + pad * 2, size[1] + pad * 2), (0, 0, 0, 0))
+    ImageDraw.Draw(shadow).rectangle([pad, pad, pad + size[0], pad + size[1]], fill=(0, 0, 0, opacity))
+    return shadow.filter(ImageFilter.GaussianBlur(blur))
+
+
+def fit_product(product, box, size):
+    """Thumbnail the product (in place) into the layer box; returns (image, position)"""
+    x, y, w, h = pixel_box(box, size)
+    product.thumbnail((w, h), Image.Resampling.LANCZOS)
+    return product, (x + (w - product.width) // 2, y + (h - product.height) // 2)
+
+
+def logo_position(logo, layer, size):
+    margin = layer['margin']
+    x = size[0] - logo.width - margin if layer['anchor'].endswith('right') else margin
+    y = size[1] - logo.height - margin if layer['anchor'].startswith('bottom') else margin
+    return x, y
+
+
+def draw_text(canvas, layer, text):
+    text = text.strip()
+    if not text:
+        return
+    if len(text) > layer['max_chars']:
+        text = text[:layer['max_chars'] - 3].rstrip() + '...'
+    if layer.get('upper'):
+        text = text.upper()
+    x, y, w, h = pixel_box(layer['box'], canvas.size)
+    stroke = layer.get('stroke', 0)
+    draw = ImageDraw.Draw(canvas)
+
+    # Shrink until the line fits the box width
+    font_size = layer['size'] * canvas.size[1]
+    while True:
+        font = fonts.get_font(layer['family'], font_size)
+        left, top, right, bottom = draw.textbbox((0, 0), text, font=font, stroke_width=stroke)
+        if right - left <= w or font_size <= 12:
+            break
+        font_size *= 0.9
+    draw.text(
+        (x + (w - (right - left)) // 2 - left, y + (h - (bottom - top)) // 2 - top),
+        text, font=font, fill=tuple(layer['fill']),
+        stroke_width=stroke, stroke_fill=(0, 0, 0)
+    )
+
+
+def render_poster(product, logo=None, text='', template=DEFAULT_TEMPLATE, size=POSTER_SIZE):
+    """
+    Render a poster from a product image (RGBA, or RGB) and an optional
+    logo, which are resized in place; returns an RGB image. Unknown
+    templates raise KeyError.
+    """
+    layers = TEMPLATES[template]
+    size = tuple(size)
+    runs = dict(_static_runs(template, size))
+
+    canvas = runs[0].copy() if 0 in runs else Image.new('RGB', size, '#ffffff')
+    product_image, product_pos = fit_product(product, next(
+        layer['box'] for layer in layers if layer['type'] == 'product'
+    ), size)
+
+    for index, layer in enumerate(layers):
+        kind = layer['type']
+        if kind in STATIC_LAYERS:
+            # Composite each cached overlay once, at the start of its run
+            if index in runs and index != 0:
+                canvas.paste(runs[index], (0, 0), runs[index])
+        elif kind == 'shadow':
+            blur = layer['blur']
+            shadow = _shadow(product_image.size, blur, layer['opacity'])
+            dx, dy = layer['offset']
+            canvas.paste(shadow, (product_pos[0] + dx - blur * 2, product_pos[1] + dy - blur * 2), shadow)
+        elif kind == 'product':
+            if product_image.mode == 'RGBA':
+                canvas.paste(product_image, product_pos, product_image)
+            else:
+                canvas.paste(product_image, product_pos)
+        elif kind == 'logo' and logo is not None:
+            logo.thumbnail((layer['size'], layer['size']), Image.Resampling.LANCZOS)
+            mask = logo if logo.mode == 'RGBA' else None
+            canvas.paste(logo, logo_position(logo, layer, size), mask)
+        elif kind == 'text':
+            draw_text(canvas, layer, text)
+
+    return canvas
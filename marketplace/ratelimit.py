@@ -0,0 +1,83 @@
+"""
+Token-bucket rate limiting.
+
+Each (URL name, client) pair has a bucket holding up to `capacity` tokens
+that refills continuously at capacity/period tokens per second; a request
+takes one token or is rejected with the time until the next token.
+Buckets live either in process memory ('local') or in Django's cache
+('cache', shared by all workers when CACHE_URL points at Redis/Memcached).
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600}
+
+
+def parse_rate(rate):
+    """Parse '10/m' into (capacity, period_seconds)"""
+    count, period = rate.split('/')
+    return int(count), PERIODS[period]
+
+
+def take_token(bucket, capacity, period, now):
+    """
+    Refill a (tokens, timestamp) bucket and try to take a token.
+    Returns (allowed, new_bucket, retry_after_seconds).
+    """
+    refill_rate = capacity / period
+    tokens, last = bucket if bucket else (capacity, now)
+    tokens = min(capacity, tokens + (now - last) * refill_rate)
+    if tokens >= 1:
+        return True, (tokens - 1, now), 0
+    return False, (tokens, now), (1 - tokens) / refill_rate
+
+
+class LocalBucketStore:
+    """In-process buckets, bounded with LRU eviction"""
+
+    def __init__(self, max_buckets=10000):
+        self.buckets = OrderedDict()
+        self.max_buckets = max_buckets
+        self.lock = threading.Lock()
+
+    def hit(self, key, capacity, period):
+        now = time.monotonic()
+        with self.lock:
+            allowed, bucket, retry_after = take_token(self.buckets.get(key), capacity, period, now)
+            self.buckets[key] = bucket
+            self.buckets.move_to_end(key)
+            if len(self.buckets) > self.max_buckets:
+                self.buckets.popitem(last=False)
+        return allowed, retry_after
+
+
+class CacheBucketStore:
+    """
+    Buckets in Django's cache. The read-modify-write is not atomic, so a
+    burst of truly simultaneous requests may slip a token or two through;
+    that is acceptable for load shedding.
+    """
+
+    def hit(self, key, capacity, period):
+        now = time.time()
+        cache_key = f'ratelimit:{key}'
+        allowed, bucket, retry_after = take_token(cache.get(cache_key), capacity, period, now)
+        cache.set(cache_key, bucket, period)
+        return allowed, retry_after
+
+
+def get_bucket_store(name):
+    if name == 'cache':
+        return CacheBucketStore()
+    return LocalBucketStore()
+
+
+def client_key(request):
+    """Per-user bucket for signed-in users, per-IP bucket otherwise"""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'user:{user.pk}'
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
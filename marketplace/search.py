@@ -0,0 +1,88 @@
+"""
+Per-user message search backed by the MessageSearchToken inverted index.
+Each message is tokenized once when it is created and a posting is stored
+for both participants, so a lookup only touches the searching user's hits.
+"""
+import re
+from collections import Counter
+
+from django.db.models import Count, Sum
+
+from .models import Message, MessageSearchToken
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+MIN_TOKEN_LENGTH = 2
+MAX_TOKEN_LENGTH = 40
+MAX_QUERY_TERMS = 8
+SNIPPET_RADIUS = 40
+
+
+def tokenize(text):
+    """Split text into lowercase search tokens"""
+    return [
+        token for token in TOKEN_RE.findall(text.lower())
+        if MIN_TOKEN_LENGTH <= len(token) <= MAX_TOKEN_LENGTH
+    ]
+
+
+def index_message(message):
+    """Add postings for a new message for both order participants"""
+    counts = Counter(tokenize(message.message))
+    if not counts:
+        return
+    
+    order = message.order
+    MessageSearchToken.objects.bulk_create([
+        MessageSearchToken(user_id=user_id, token=token, message=message, weight=min(weight, 32767))
+        for user_id in {order.buyer_id, order.seller_id}
+        for token, weight in counts.items()
+    ])
+
+
+def make_snippet(text, terms):
+    """Return a short excerpt of text around the first matching term"""
+    lowered = text.lower()
+    positions = [lowered.find(term) for term in terms]
+    positions = [pos for pos in positions if pos >= 0]
+    start = max(min(positions) - SNIPPET_RADIUS, 0) if positions else 0
+    end = min(start + SNIPPET_RADIUS * 3, len(text))
+    
+    snippet = text[start:end]
+    if start > 0:
+        snippet = '...' + snippet
+    if end < len(text):
+        snippet = snippet + '...'
+    return snippet
+
+
+def search_messages(user, query, page=1, page_size=20):
+    """
+    Search the messages of orders the user is part of.
+    Hits are ranked by number of distinct matched terms, then by total term
+    frequency, then newest first. Returns (messages, terms, has_more); each
+    message carries a `search_snippet` attribute.
+    """
+    terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+    if not terms:
+        return [], terms, False
+    
+    offset = (page - 1) * page_size
+    ranked = list(
+        MessageSearchToken.objects.filter(user=user, token__in=terms)
+        .values('message_id')
+        .annotate(matched=Count('token', distinct=True), score=Sum('weight'))
+        .order_by('-matched', '-score', '-message_id')[offset:offset + page_size + 1]
+    )
+    has_more = len(ranked) > page_size
+    message_ids = [row['message_id'] for row in ranked[:page_size]]
+    
+    found = Message.objects.select_related('sender', 'order__gig').in_bulk(message_ids)
+    results = []
+    for message_id in message_ids:
+        message = found.get(message_id)
+        if message is None:
+            continue
+        message.search_snippet = make_snippet(message.message, terms)
+        results.append(message)
+    
+    return results, terms, has_more
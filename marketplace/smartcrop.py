@@ -0,0 +1,157 @@
+"""
+Derive ad formats from one master image.
+
+An ad set is one creative in several aspect ratios (see
+image_generation.FORMAT_SIZES). Instead of generating each ratio upstream,
+one master is generated and every format is reframed from it locally:
+
+1. saliency_box() finds the subject on a small copy of the master: pixels
+   that differ from the dominant border colour (the backdrop), plus edges.
+2. crop_window() picks the window of the target aspect ratio centred on
+   the subject. If the subject does not fit inside a crop, the window
+   grows past the master and the missing backdrop is synthesized.
+3. derive() renders the window at the target size: a plain resize of the
+   crop, or the master with its edge strips stretched out and blurred
+   to extend the backdrop.
+
+Pillow only (NumPy is not a dependency of this project).
+"""
+from PIL import Image, ImageChops, ImageDraw, ImageFilter, ImageStat
+
+SALIENCY_SIZE = 128
+# Pixels whose saliency reaches this share of the maximum belong to the subject
+SALIENCY_THRESHOLD = 0.35
+# Minimum saliency (0-255) for anything to count as a subject
+SALIENCY_FLOOR = 24
+# Breathing room kept around the subject, as a share of the master's long side
+SUBJECT_MARGIN = 0.04
+# Width of the master edge strip stretched over extended backdrop
+EDGE_STRIP = 4
+EXTENSION_BLUR = 12
+
+
+def saliency_box(image):
+    """
+    Return the subject's bounding box (left, top, right, bottom) in image
+    coordinates, or None for a uniform image.
+    """
+    small = image.convert('RGB')
+    small.thumbnail((SALIENCY_SIZE, SALIENCY_SIZE))
+    width, height = small.size
+
+    # The backdrop colour is the median of a thin border ring
+    ring = Image.new('L', small.size, 255)
+    ImageDraw.Draw(ring).rectangle([2, 2, width - 3, height - 3], fill=0)
+    backdrop = tuple(int(v) for v in ImageStat.Stat(small, ring).median)
+
+    distance = ImageChops.difference(small, Image.new('RGB', small.size, backdrop)).convert('L')
+    edges = small.convert('L').filter(ImageFilter.FIND_EDGES)
+    # FIND_EDGES responds along the image border; blank it
+    edges.paste(0, (0, 0, width, height), ring)
+    saliency = ImageChops.add(distance, edges).filter(ImageFilter.BoxBlur(1))
+
+    peak = saliency.getextrema()[1]
+    if peak < SALIENCY_FLOOR:
+        return None
+    threshold = max(SALIENCY_FLOOR, peak * SALIENCY_THRESHOLD)
+    box = saliency.point(lambda v: 255 if v >= threshold else 0).getbbox()
+    if box is None:
+        return None
+    scale_x, scale_y = image.width / width, image.height / height
+    return (box[0] * scale_x, box[1] * scale_y, box[2] * scale_x, box[3] * scale_y)
+
+
+def crop_window(master_size, aspect, subject=None):
+    """
+    Return the window (left, top, width, height), in master coordinates,
+    with the target aspect ratio (width / height) that shows the subject.
+    The window may extend past the master when the subject would not fit.
+    """
+    master_w, master_h = master_size
+    if master_w / master_h > aspect:
+        width, height = master_h * aspect, master_h
+    else:
+        width, height = master_w, master_w / aspect
+
+    if subject is None:
+        subject = (0, 0, master_w, master_h)
+        scale = 1
+    else:
+        margin = SUBJECT_MARGIN * max(master_size)
+        subject = (
+            max(subject[0] - margin, 0), max(subject[1] - margin, 0),
+            min(subject[2] + margin, master_w), min(subject[3] + margin, master_h)
+        )
+        scale = max(1, (subject[2] - subject[0]) / width, (subject[3] - subject[1]) / height)
+    width, height = width * scale, height * scale
+
+    def place(centre, size, limit):
+        # Inside the master: keep the window within it; larger: keep the master within the window
+        low, high = min(0, limit - size), max(0, limit - size)
+        return min(max(centre - size / 2, low), high)
+
+    left = place((subject[0] + subject[2]) / 2, width, master_w)
+    top = place((subject[1] + subject[3]) / 2, height, master_h)
+    return left, top, width, height
+
+
+def extend_backdrop(image, size, offset):
+    """
+    Place `image` at `offset` on a canvas of `size`, filling the rest by
+    stretching the image's edge strips outwards, softened with a blur.
+    """
+    width, height = size
+    x, y = offset
+    strip = EDGE_STRIP
+
+    # Horizontal extension first, then vertical on the widened image, so corners are filled too
+    wide = Image.new('RGB', (width, image.height))
+    wide.paste(image, (x, 0))
+    if x > 0:
+        wide.paste(image.crop((0, 0, strip, image.height)).resize((x, image.height)), (0, 0))
+    if x + image.width < width:
+        right = width - x - image.width
+        wide.paste(image.crop((image.width - strip, 0, image.width, image.height)).resize((right, image.height)),
+                   (x + image.width, 0))
+
+    canvas = Image.new('RGB', size)
+    canvas.paste(wide, (0, y))
+    if y > 0:
+        canvas.paste(wide.crop((0, 0, width, strip)).resize((width, y)), (0, 0))
+    if y + image.height < height:
+        bottom = height - y - image.height
+        canvas.paste(wide.crop((0, image.height - strip, width, image.height)).resize((width, bottom)),
+                     (0, y + image.height))
+
+    # Soften the stretched stripes (blurred at 1/4 scale, which is much cheaper
+    # and invisible on a backdrop), then put the untouched image back on top
+    canvas = canvas.reduce(4).filter(ImageFilter.GaussianBlur(EXTENSION_BLUR / 4)).resize(
+        size, Image.Resampling.BILINEAR
+    )
+    canvas.paste(image, (x, y))
+    return canvas
+
+
+def derive(master, size, subject=None):
+    """Reframe `master` (RGB) to `size`, keeping the subject in view"""
+    target_w, target_h = size
+    left, top, width, height = crop_window(master.size, target_w / target_h, subject)
+
+    if left >= 0 and top >= 0 and left + width <= master.width + 0.5 and top + height <= master.height + 0.5:
+        box = (left, top, min(left + width, master.width), min(top + height, master.height))
+        return master.resize(size, Image.Resampling.LANCZOS, box=box, reducing_gap=2.0)
+
+    # Work at the target scale: shrink the master once, then extend around it
+    scale = target_w / width
+    scaled = master.resize(
+        (max(1, round(master.width * scale)), max(1, round(master.height * scale))),
+        Image.Resampling.LANCZOS, reducing_gap=2.0
+    )
+    return extend_backdrop(scaled, size, (round(-left * scale), round(-top * scale)))
+
+
+def derive_all(master, sizes):
+    """Reframe `master` to each size in `sizes`; saliency is computed once"""
+    master = master.convert('RGB')
+    subject = saliency_box(master)
+    return [derive(master, tuple(size), subject) for size in sizes]
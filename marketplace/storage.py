@@ -0,0 +1,97 @@
+"""
+Content-addressed media storage.
+
+Files are named by the SHA-256 of their bytes and sharded two levels deep
+by hash prefix, e.g. `posters/3f/a2/3fa2...e1.jpg`, so identical posters,
+generated images and uploads are stored once and no directory grows past
+a few hundred entries. The name passed in only contributes its directory
+(the namespace) and extension.
+
+A save streams the content into a temporary file next to its final
+location while hashing it, then either discards the temporary file (the
+blob already exists) or moves it into place with os.replace, so readers
+never see a partially written file.
+"""
+import hashlib
+import io
+import os
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+
+HASH_ALGORITHM = 'sha256'
+SHARD_DEPTH = 2
+SHARD_WIDTH = 2
+
+
+def sharded_name(namespace, digest, ext):
+    shards = [digest[i * SHARD_WIDTH:(i + 1) * SHARD_WIDTH] for i in range(SHARD_DEPTH)]
+    return '/'.join([namespace.strip('/'), *shards, digest + ext.lower()]).lstrip('/')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage that stores each distinct blob once under its hash"""
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is chosen in _save from the content hash
+        return name
+
+    def _save(self, name, content):
+        namespace = os.path.dirname(name)
+        ext = os.path.splitext(name)[1]
+        staging_dir = self.path(namespace)
+        os.makedirs(staging_dir, exist_ok=True)
+
+        digest = hashlib.new(HASH_ALGORITHM)
+        fd, temp_path = tempfile.mkstemp(dir=staging_dir, prefix='.incoming-')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+
+            final_name = sharded_name(namespace, digest.hexdigest(), ext)
+            final_path = self.path(final_name)
+            if os.path.exists(final_path):
+                os.unlink(temp_path)
+                # Refresh the mtime so gc_media's retention window counts from the latest save
+                os.utime(final_path)
+                return final_name
+
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.chmod(temp_path, self.file_permissions_mode if self.file_permissions_mode is not None else 0o644)
+            os.replace(temp_path, final_path)
+            return final_name
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+
+content_storage = ContentAddressedStorage()
+
+
+def media_storage():
+    """Storage for model file fields (a callable, so migrations reference it by path)"""
+    return content_storage
+
+
+def store_bytes(namespace, data, ext):
+    """Store raw bytes under `namespace`; returns the storage name"""
+    return content_storage.save(f'{namespace}/upload{ext}', ContentFile(data))
+
+
+def save_bytes(namespace, data, ext):
+    """Store raw bytes under `namespace`; returns the public URL"""
+    return content_storage.url(store_bytes(namespace, data, ext))
+
+
+def save_image(namespace, image, format='JPEG', **params):
+    """Encode a PIL image and store it under `namespace`; returns the public URL"""
+    buffer = io.BytesIO()
+    image.save(buffer, format, **params)
+    ext = '.jpg' if format == 'JPEG' else f'.{format.lower()}'
+    return save_bytes(namespace, buffer.getvalue(), ext)
@@ -1,6 +1,32 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.contrib.auth.models import User
-from .models import UserProfile, Category, Gig, Order
+from django.core.cache import cache, caches
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest.mock import patch
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import base64
+import os
+import threading
+import time
+from .models import (
+    UserProfile, Category, Gig, Order, Message, Conversation, Notification,
+    ArchivedMessage, ArchivedNotification, ImageGenerationJob
+)
+from . import notifications, ai_text, ai_client, image_generation, backgrounds, fonts, posters, smartcrop, storage, uploads
+from .management.commands.image_worker import Command as ImageWorkerCommand
+from .ratelimit import parse_rate, take_token
+import json
+import re
+import shutil
+import tempfile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageChops
 
 # Create your tests here.
 
@@ -40,3 +66,1001 @@ class GigTestCase(TestCase):
         self.assertEqual(gig.title, 'Test Gig')
         self.assertEqual(gig.price, 100.00)
         self.assertEqual(gig.status, 'active')
+
+
+class OrderTestCase(TestCase):
+    """Base for tests that need a seller, a buyer and an order between them"""
+
+    def setUp(self):
+        self.seller = User.objects.create_user(username='seller', password='testpass123')
+        self.buyer = User.objects.create_user(username='buyer', password='testpass123')
+        self.gig = Gig.objects.create(
+            seller=self.seller,
+            title='Test Gig',
+            description='Test description',
+            price=100.00,
+            delivery_time=3
+        )
+        self.order = self.create_order()
+
+    def create_order(self, **kwargs):
+        return Order.objects.create(gig=self.gig, buyer=self.buyer, seller=self.seller, price=100.00, **kwargs)
+
+
+class OrderMessagesTestCase(OrderTestCase):
+    def setUp(self):
+        super().setUp()
+        self.messages = [
+            Message.objects.create(order=self.order, sender=self.seller, message=f'Message {i}')
+            for i in range(5)
+        ]
+        self.client.login(username='buyer', password='testpass123')
+
+    def test_after_id_returns_only_new_messages(self):
+        """Test that polling with after_id returns only newer messages"""
+        url = f'/api/orders/{self.order.id}/messages/?after_id={self.messages[2].id}'
+        data = self.client.get(url).json()
+        self.assertEqual([m['id'] for m in data['messages']], [m.id for m in self.messages[3:]])
+
+    def test_before_id_pages_history(self):
+        """Test that before_id returns the older page in chronological order"""
+        url = f'/api/orders/{self.order.id}/messages/?before_id={self.messages[4].id}&limit=2'
+        data = self.client.get(url).json()
+        self.assertEqual([m['id'] for m in data['messages']], [m.id for m in self.messages[2:4]])
+        self.assertTrue(data['has_more'])
+
+    def test_read_marking_skipped_when_nothing_unread(self):
+        """Test that messages are marked read once and later polls do not write"""
+        self.client.get(f'/api/orders/{self.order.id}/messages/')
+        self.assertFalse(Message.objects.filter(order=self.order, is_read=False).exists())
+        with self.assertNumQueries(4):
+            # session, user, order and the message window - no UPDATE
+            self.client.get(f'/api/orders/{self.order.id}/messages/?after_id={self.messages[-1].id}')
+
+
+class ConversationSummaryTestCase(OrderTestCase):
+    def send(self, username, text):
+        self.client.login(username=username, password='testpass123')
+        self.client.post(
+            f'/api/orders/{self.order.id}/send-message/',
+            data=json.dumps({'message': text}),
+            content_type='application/json'
+        )
+
+    def test_summary_tracks_last_message_and_unread(self):
+        """Test that sending updates the snippet and the recipient's unread counter"""
+        self.send('buyer', 'Hello there')
+        self.send('buyer', 'x' * 80)
+        
+        conversation = Conversation.objects.get(order=self.order)
+        self.assertEqual(conversation.last_message_snippet, 'x' * 50 + '...')
+        self.assertEqual(conversation.seller_unread, 2)
+        self.assertEqual(conversation.buyer_unread, 0)
+
+    def test_reading_resets_unread_counter(self):
+        """Test that the inbox reflects messages read by the recipient"""
+        self.send('buyer', 'Hello there')
+        self.client.login(username='seller', password='testpass123')
+        self.assertEqual(self.client.get('/api/conversations/').json()['total_unread'], 1)
+        
+        self.client.get(f'/api/orders/{self.order.id}/messages/')
+        data = self.client.get('/api/conversations/').json()
+        self.assertEqual(data['total_unread'], 0)
+        self.assertEqual(data['conversations'][0]['last_message'], 'Hello there')
+
+
+class MessageSearchTestCase(OrderTestCase):
+    def setUp(self):
+        super().setUp()
+        self.outsider = User.objects.create_user(username='outsider', password='testpass123')
+        self.client.login(username='buyer', password='testpass123')
+        for text in ['Please use a blue logo', 'Blue logo with blue border please', 'Thanks!']:
+            self.client.post(
+                f'/api/orders/{self.order.id}/send-message/',
+                data=json.dumps({'message': text}),
+                content_type='application/json'
+            )
+
+    def test_search_ranks_hits(self):
+        """Test that messages matching more terms and occurrences rank first"""
+        data = self.client.get('/api/messages/search/', {'q': 'blue logo'}).json()
+        self.assertEqual(len(data['results']), 2)
+        self.assertEqual(data['results'][0]['snippet'], 'Blue logo with blue border please')
+
+    def test_search_restricted_to_participants(self):
+        """Test that users only find messages from their own orders"""
+        self.client.login(username='outsider', password='testpass123')
+        data = self.client.get('/api/messages/search/', {'q': 'blue'}).json()
+        self.assertEqual(data['results'], [])
+
+
+class ArchiveCommandTestCase(OrderTestCase):
+    def setUp(self):
+        super().setUp()
+        self.open = self.order
+        self.closed = self.create_order(status='completed')
+        for order in (self.closed, self.open):
+            Message.objects.create(order=order, sender=self.buyer, message='Hello')
+        Order.objects.filter(id=self.closed.id).update(updated_at=timezone.now() - timedelta(days=120))
+        
+        old = Notification.objects.create(user=self.buyer, notification_type='order_completed', title='Old', message='Old', is_read=True)
+        Notification.objects.filter(id=old.id).update(created_at=timezone.now() - timedelta(days=60))
+        Notification.objects.create(user=self.buyer, notification_type='order_placed', title='New', message='New', is_read=True)
+
+    def test_archive_moves_cold_rows(self):
+        """Test that only closed-order messages and old read notifications move"""
+        call_command('archive', batch_size=1, stdout=StringIO())
+        
+        self.assertEqual(list(Message.objects.values_list('order_id', flat=True)), [self.open.id])
+        self.assertEqual(ArchivedMessage.objects.get().order_id, self.closed.id)
+        self.assertEqual(list(Notification.objects.values_list('title', flat=True)), ['New'])
+        self.assertEqual(ArchivedNotification.objects.get().title, 'Old')
+
+    def test_archived_messages_readable_on_demand(self):
+        """Test that archived messages are served with archived=1"""
+        call_command('archive', stdout=StringIO())
+        self.client.login(username='buyer', password='testpass123')
+        
+        live = self.client.get(f'/api/orders/{self.closed.id}/messages/').json()
+        self.assertEqual(live['messages'], [])
+        self.assertTrue(live['has_archived'])
+        archived = self.client.get(f'/api/orders/{self.closed.id}/messages/?archived=1').json()
+        self.assertEqual(archived['messages'][0]['message'], 'Hello')
+
+
+@override_settings(CACHE_URL='redis://shared-cache')
+class NotificationUnreadCounterTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='buyer', password='testpass123')
+        self.client.login(username='buyer', password='testpass123')
+
+    def test_counter_follows_create_and_read(self):
+        """Test that the cached unread count tracks notify and mark-read"""
+        first = notifications.notify(self.user, 'order_placed', 'One', 'One')
+        self.assertEqual(self.client.get('/api/notifications/').json()['unread_count'], 1)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            notifications.notify(self.user, 'order_placed', 'Two', 'Two')
+        self.assertEqual(self.client.get('/api/notifications/').json()['unread_count'], 2)
+        
+        self.client.post(f'/api/notifications/{first.id}/read/')
+        self.client.post(f'/api/notifications/{first.id}/read/')
+        self.assertEqual(self.client.get('/api/notifications/').json()['unread_count'], 1)
+        
+        self.client.post('/api/notifications/mark-all-read/')
+        self.assertEqual(notifications.get_unread_count(self.user), 0)
+        self.assertFalse(Notification.objects.filter(is_read=False).exists())
+
+    def test_counter_not_cached_without_shared_cache(self):
+        """Test that per-process caches are bypassed so workers cannot disagree"""
+        with self.settings(CACHE_URL=''):
+            notifications.notify(self.user, 'order_placed', 'One', 'One')
+            self.assertEqual(notifications.get_unread_count(self.user), 1)
+        self.assertIsNone(cache.get(notifications.unread_count_key(self.user.id)))
+
+
+class NotificationCoalescingTestCase(OrderTestCase):
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+
+    def test_message_burst_becomes_one_notification(self):
+        """Test that several messages on one order coalesce into one unread row"""
+        self.client.login(username='buyer', password='testpass123')
+        for i in range(3):
+            self.client.post(
+                f'/api/orders/{self.order.id}/send-message/',
+                data=json.dumps({'message': f'Message {i}'}),
+                content_type='application/json'
+            )
+        
+        notification = Notification.objects.get(user=self.seller)
+        self.assertEqual(notification.count, 3)
+        self.assertEqual(notification.message, 'Message 2')
+
+    def test_read_notification_starts_new_group(self):
+        """Test that an event after reading creates a fresh notification"""
+        first = notifications.notify(self.seller, 'message_received', 'New', 'One', order=self.order, coalesce=True)
+        notifications.mark_read(self.seller, first.id)
+        notifications.notify(self.seller, 'message_received', 'New', 'Two', order=self.order, coalesce=True)
+        self.assertEqual(Notification.objects.filter(user=self.seller).count(), 2)
+
+
+@override_settings(
+    CACHE_URL='redis://shared-cache',
+    STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+)
+class AdminUserResolutionTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(username='staff', password='testpass123', is_staff=True, is_superuser=True)
+        self.client.post('/admin/login/', {'username': 'staff', 'password': 'testpass123'})
+
+    def user_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/admin/')
+        self.assertEqual(response.status_code, 200)
+        # Unquoted match so it holds for MySQL backticks as well
+        return [q for q in ctx.captured_queries if re.search(r'\bFROM\W+auth_user\W', q['sql'])]
+
+    def test_admin_user_cached_across_requests(self):
+        """Test that admin pages stop querying the admin's User row"""
+        self.client.get('/admin/')
+        self.assertEqual(self.user_queries(), [])
+
+    def test_cache_invalidated_on_user_save(self):
+        """Test that revoking staff access takes effect immediately"""
+        self.client.get('/admin/')
+        self.admin.is_staff = False
+        self.admin.save()
+        self.assertEqual(self.client.get('/admin/').status_code, 302)
+
+
+@override_settings(
+    CACHE_URL='redis://shared-cache',
+    SESSION_ENGINE='django.contrib.sessions.backends.cached_db',
+    AUTHENTICATION_BACKENDS=['marketplace.backends.CachedModelBackend'],
+)
+class CachedSessionTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user(username='buyer', password='testpass123')
+        self.client.login(username='buyer', password='testpass123')
+
+    def test_poll_skips_session_and_user_queries(self):
+        """Test that a repeat request loads neither the session nor the user row"""
+        self.client.get('/api/notifications/')
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/notifications/')
+        tables = ' '.join(q['sql'] for q in ctx.captured_queries)
+        self.assertNotIn('django_session', tables)
+        self.assertIsNone(re.search(r'\bFROM\W+auth_user\W', tables))
+
+
+class RateLimitTestCase(TestCase):
+    def test_bucket_refills_over_time(self):
+        """Test that a bucket allows a burst, then refills at the configured rate"""
+        self.assertEqual(parse_rate('10/m'), (10, 60))
+        allowed, bucket, retry_after = take_token(None, 2, 60, now=0)
+        allowed, bucket, retry_after = take_token(bucket, 2, 60, now=0)
+        self.assertTrue(allowed)
+        allowed, bucket, retry_after = take_token(bucket, 2, 60, now=0)
+        self.assertFalse(allowed)
+        self.assertEqual(retry_after, 30)
+        allowed, bucket, retry_after = take_token(bucket, 2, 60, now=30)
+        self.assertTrue(allowed)
+
+    def test_endpoint_returns_429_with_retry_after(self):
+        """Test that exceeding an endpoint's limit returns 429"""
+        User.objects.create_user(username='buyer', password='testpass123')
+        self.client.login(username='buyer', password='testpass123')
+        for _ in range(5):
+            self.client.post('/api/generate-product-image/', data='{}', content_type='application/json')
+        response = self.client.post('/api/generate-product-image/', data='{}', content_type='application/json')
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(int(response['Retry-After']) >= 1)
+
+
+class TextGenerationFanOutTestCase(TestCase):
+    def slow_section(self, api_key, section, prompt, use_cache=True, timeout=None):
+        time.sleep(0.3 if section != 'hooks' else 2)
+        return f'{section} text'
+
+    def test_sections_run_concurrently_within_budget(self):
+        """Test that sections run in parallel and late ones fall back"""
+        with patch.object(ai_text, 'generate_section', side_effect=self.slow_section):
+            started = time.monotonic()
+            content = ai_text.generate_sections('key', ai_text.SECTIONS, 'Shoes', '', 'instagram', budget=1)
+            elapsed = time.monotonic() - started
+        
+        self.assertLess(elapsed, 1.5)
+        self.assertEqual(content['caption'], 'caption text')
+        self.assertEqual(content['cta'], 'cta text')
+        self.assertEqual(content['hooks'], ai_text.SECTION_FALLBACKS['hooks'])
+
+
+class TextContentCacheTestCase(TestCase):
+    def setUp(self):
+        caches['ai_content'].clear()
+
+    def test_near_repeat_prompt_served_from_cache(self):
+        """Test that prompts differing only in case/whitespace share a cache entry"""
+        with patch.object(ai_text, 'request_completion', return_value='Fresh caption') as upstream:
+            first = ai_text.generate_section('key', 'caption', 'Caption for  Red Shoes')
+            second = ai_text.generate_section('key', 'caption', 'caption for red shoes ')
+        
+        self.assertEqual(first, second)
+        self.assertEqual(upstream.call_count, 1)
+        self.assertGreaterEqual(ai_text.get_cache_stats()['caption']['hit'], 1)
+
+    def test_fallbacks_are_not_cached(self):
+        """Test that a failed completion is retried on the next request"""
+        with patch.object(ai_text, 'request_completion', side_effect=RuntimeError('down')):
+            self.assertEqual(ai_text.generate_section('key', 'cta', 'CTA prompt'), ai_text.SECTION_FALLBACKS['cta'])
+        with patch.object(ai_text, 'request_completion', return_value='Buy now') as upstream:
+            self.assertEqual(ai_text.generate_section('key', 'cta', 'CTA prompt'), 'Buy now')
+        self.assertEqual(upstream.call_count, 1)
+
+
+class StructuredTextGenerationTestCase(TestCase):
+    def setUp(self):
+        caches['ai_content'].clear()
+        User.objects.create_user(username='seller', password='testpass123')
+        self.client.login(username='seller', password='testpass123')
+
+    def test_one_call_with_per_section_fallback(self):
+        """Test that one completion fills all sections and bad fields fall back"""
+        reply = '```json\n{"caption": "Glow up", "hashtags": ["#candles", "#eco"], "cta": ""}\n```'
+        with patch.object(ai_text, 'request_completion', return_value=reply) as upstream:
+            response = self.client.post(
+                '/api/generate-text-content/',
+                data=json.dumps({
+                    'product_desc': 'Soy candles', 'mode': 'structured',
+                    'gen_caption': True, 'gen_hashtags': True, 'gen_cta': True, 'gen_hooks': True,
+                }),
+                content_type='application/json'
+            )
+        
+        self.assertEqual(upstream.call_count, 1)
+        content = response.json()['content']
+        self.assertEqual(content['caption'], 'Glow up')
+        self.assertEqual(content['hashtags'], '#candles #eco')
+        self.assertEqual(content['cta'], ai_text.SECTION_FALLBACKS['cta'])
+        self.assertEqual(content['hooks'], ai_text.SECTION_FALLBACKS['hooks'])
+
+    def test_only_complete_replies_are_cached(self):
+        """Test that a malformed reply is not cached and a complete one is"""
+        args = ('key', ['caption', 'cta'], 'Soy candles', '', 'instagram')
+        with patch.object(ai_text, 'request_completion', return_value='not json'):
+            content = ai_text.generate_sections_structured(*args)
+        self.assertEqual(content['caption'], ai_text.SECTION_FALLBACKS['caption'])
+        
+        reply = '{"caption": "Glow up", "cta": "Buy now"}'
+        with patch.object(ai_text, 'request_completion', return_value=reply) as upstream:
+            ai_text.generate_sections_structured(*args)
+            content = ai_text.generate_sections_structured(*args)
+        self.assertEqual(upstream.call_count, 1)
+        self.assertEqual(content, {'caption': 'Glow up', 'cta': 'Buy now'})
+
+    def test_structured_call_respects_budget(self):
+        """Test that a slow structured completion falls back within the budget"""
+        def slow_completion(api_key, prompt, **options):
+            time.sleep(2)
+            return '{"caption": "Late"}'
+        
+        with patch.object(ai_text, 'request_completion', side_effect=slow_completion) as upstream:
+            started = time.monotonic()
+            content = ai_text.generate_sections_structured('key', ['caption'], 'Shoes', '', 'instagram', budget=0.5)
+        
+        self.assertLess(time.monotonic() - started, 1.5)
+        # The budget is also the call's own timeout, so the worker thread is freed in time
+        self.assertEqual(upstream.call_args.kwargs['timeout'], 0.5)
+        self.assertEqual(content['caption'], ai_text.SECTION_FALLBACKS['caption'])
+
+
+class TextStreamingTestCase(TestCase):
+    def setUp(self):
+        caches['ai_content'].clear()
+        User.objects.create_user(username='seller', password='testpass123')
+        self.client.login(username='seller', password='testpass123')
+
+    def stream_events(self, response):
+        events = []
+        for block in b''.join(response.streaming_content).decode().strip().split('\n\n'):
+            event, data = block.split('\n')
+            events.append((event[len('event: '):], json.loads(data[len('data: '):])))
+        return events
+
+    def test_sections_stream_as_tagged_events(self):
+        """Test that deltas are tagged by section and failures end with the fallback"""
+        def fake_stream(api_key, prompt):
+            if 'hashtags' in prompt:
+                raise ai_client.AIClientError('down')
+            yield 'Glow '
+            yield 'up'
+        
+        with patch.object(ai_text, 'stream_completion', side_effect=fake_stream):
+            response = self.client.post(
+                '/api/generate-text-content/stream/',
+                data=json.dumps({'product_desc': 'Soy candles', 'gen_caption': True, 'gen_hashtags': True}),
+                content_type='application/json'
+            )
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            events = self.stream_events(response)
+        
+        deltas = [data['text'] for event, data in events if event == 'delta']
+        done = {data['section']: data['text'] for event, data in events if event == 'done'}
+        self.assertEqual(deltas, ['Glow ', 'up'])
+        self.assertEqual(done, {'caption': 'Glow up', 'hashtags': ai_text.SECTION_FALLBACKS['hashtags']})
+        self.assertEqual(events[-1][0], 'end')
+
+
+class ImageJobTestCase(TestCase):
+    def setUp(self):
+        User.objects.create_user(username='buyer', password='testpass123')
+        self.client.login(username='buyer', password='testpass123')
+
+    def test_imagine_page_uses_sync_path_without_queue(self):
+        """Test that the page only polls jobs when the job queue is enabled"""
+        self.assertContains(self.client.get('/imagine/'), 'const USE_IMAGE_JOBS = false;')
+        with self.settings(IMAGE_JOB_QUEUE=True):
+            self.assertContains(self.client.get('/imagine/'), 'const USE_IMAGE_JOBS = true;')
+
+    def test_submit_process_and_fetch_job(self):
+        """Test that a queued job is claimed once, processed and reported"""
+        response = self.client.post(
+            '/api/image-jobs/',
+            data=json.dumps({'product_type': 'Sneakers', 'style': 'Bold', 'format': 'story'}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json()['job_id']
+        
+        worker = ImageWorkerCommand(stdout=StringIO(), stderr=StringIO())
+        worker.max_attempts = 3
+        job = worker.claim_job()
+        self.assertEqual(job.id, job_id)
+        self.assertIsNone(worker.claim_job())
+        
+        result = {'image_url': '/media/ai_images/test.jpg', 'prompt_used': 'prompt'}
+        with patch.object(image_generation, 'generate_product_image', return_value=result) as generate:
+            worker.process_job(job)
+        self.assertEqual(generate.call_args[0][1:], ('Sneakers', 'Bold', 'white', 'story'))
+        
+        data = self.client.get(f'/api/image-jobs/{job_id}/').json()
+        self.assertEqual(data['status'], 'done')
+        self.assertEqual(data['image_url'], '/media/ai_images/test.jpg')
+
+    def test_stale_job_counts_attempts_and_discards_late_result(self):
+        """Test that a hung job is retried a bounded number of times and its late result is dropped"""
+        user = User.objects.get(username='buyer')
+        ImageGenerationJob.objects.create(user=user, params={'product_type': 'Mug', 'style': 'Calm'})
+        worker = ImageWorkerCommand(stdout=StringIO(), stderr=StringIO())
+        worker.max_attempts = 2
+        
+        hung = worker.claim_job()
+        ImageGenerationJob.objects.filter(id=hung.id).update(started_at=timezone.now() - timedelta(minutes=10))
+        hung.refresh_from_db()
+        worker.requeue_stale_jobs(stale_after=300)
+        retry = worker.claim_job()
+        self.assertEqual(retry.attempts, 2)
+        
+        result = {'image_url': '/media/ai_images/late.jpg', 'prompt_used': 'prompt'}
+        with patch.object(image_generation, 'generate_product_image', return_value=result):
+            worker.process_job(hung)
+        self.assertEqual(ImageGenerationJob.objects.get(id=hung.id).status, 'running')
+        
+        ImageGenerationJob.objects.filter(id=retry.id).update(started_at=timezone.now() - timedelta(minutes=10))
+        worker.requeue_stale_jobs(stale_after=300)
+        self.assertEqual(ImageGenerationJob.objects.get(id=retry.id).status, 'failed')
+
+
+@override_settings(SEEDREAM_API_KEY='test-key')
+class ImageSetTestCase(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        User.objects.create_user(username='buyer', password='testpass123')
+        self.client.login(username='buyer', password='testpass123')
+
+    def post(self, **data):
+        data = {'product_type': 'Sneakers', 'style': 'Bold', **data}
+        return self.client.post('/api/generate-product-images/', data=json.dumps(data),
+                                content_type='application/json')
+
+    def test_ad_set_reframes_one_master_per_variation(self):
+        """Test that each variation costs one upstream call and every format comes back together"""
+        def upstream(api_key, prompt):
+            # Variation 1 gets a master; variation 2 falls back to placeholders
+            if 'variation 1 of 2' not in prompt:
+                return None
+            master = Image.new('RGB', image_generation.MASTER_SIZE, 'white')
+            master.paste((255, 0, 0), (1200, 800, 1600, 1200))
+            buffer = BytesIO()
+            master.save(buffer, 'PNG')
+            return storage.store_bytes(image_generation.IMAGE_NAMESPACE, buffer.getvalue(), '.png')
+        
+        with self.settings(MEDIA_ROOT=self.media_root), \
+                patch.object(image_generation, 'fetch_upstream_image', side_effect=upstream) as fetch:
+            response = self.post(formats=['square', 'story', 'landscape'], variations=2)
+            
+            self.assertEqual(fetch.call_count, 2)
+            images = response.json()['images']
+            self.assertEqual([(i['format'], i['variation']) for i in images], [
+                ('square', 1), ('square', 2), ('story', 1), ('story', 2), ('landscape', 1), ('landscape', 2)
+            ])
+            self.assertIn('variation 2 of 2', images[1]['prompt_used'])
+            for image, size in zip(images, [(1080, 1080)] * 2 + [(1080, 1920)] * 2 + [(1200, 628)] * 2):
+                with Image.open(os.path.join(self.media_root, image['image_url'][len('/media/'):])) as stored:
+                    self.assertEqual(stored.size, size)
+                    # The red square product survives every reframe of the master uncropped
+                    if image['variation'] == 1:
+                        r, g, b = stored.convert('RGB').split()
+                        red = ImageChops.subtract(r, g).point(lambda v: 255 if v > 150 else 0)
+                        left, top, right, bottom = red.getbbox()
+                        self.assertAlmostEqual((right - left) / (bottom - top), 1, delta=0.05)
+                        self.assertTrue(0 < left and right < stored.width and 0 < top and bottom < stored.height)
+
+    def test_rejects_invalid_sets(self):
+        """Test that unknown formats and out-of-range variations are rejected"""
+        self.assertEqual(self.post(formats=['banner']).status_code, 400)
+        self.assertEqual(self.post(variations=image_generation.MAX_VARIATIONS + 1).status_code, 400)
+
+
+class SmartCropTestCase(TestCase):
+    def master(self, box, size=(2048, 2048)):
+        image = backgrounds.vertical_gradient(size, (147, 51, 234), (59, 130, 246))
+        image.paste((255, 255, 255), box)
+        return image
+
+    def test_saliency_finds_off_centre_subject(self):
+        """Test that the subject box covers an off-centre product"""
+        left, top, right, bottom = smartcrop.saliency_box(self.master((1300, 300, 1800, 800)))
+        self.assertLessEqual(left, 1300)
+        self.assertGreaterEqual(right, 1790)
+        self.assertLessEqual(top, 300)
+        self.assertLess(bottom, 1000)
+
+    def test_crop_keeps_subject_and_extends_backdrop(self):
+        """Test that every format keeps the subject, extending the backdrop when a crop cannot"""
+        sizes = list(image_generation.FORMAT_SIZES.values())
+        # A wide banner cannot fit a 9:16 crop, so the story is extended above and below
+        for master in (self.master((1300, 300, 1800, 800)), self.master((100, 900, 1948, 1150))):
+            subject = smartcrop.saliency_box(master)
+            for size, derived in zip(sizes, smartcrop.derive_all(master, sizes)):
+                self.assertEqual(derived.size, size)
+                left, top, width, height = smartcrop.crop_window(master.size, size[0] / size[1], subject)
+                scale = size[0] / width
+                centre = ((subject[0] + subject[2]) / 2 - left) * scale, ((subject[1] + subject[3]) / 2 - top) * scale
+                self.assertEqual(derived.getpixel(tuple(map(int, centre))), (255, 255, 255))
+        # The extended backdrop continues the gradient's top colour
+        story = smartcrop.derive_all(self.master((100, 900, 1948, 1150)), [(1080, 1920)])[0]
+        self.assertLess(sum(abs(a - b) for a, b in zip(story.getpixel((540, 5)), (147, 51, 234))), 12)
+
+
+class BackgroundCacheTestCase(TestCase):
+    def test_gradient_matches_end_colours_and_is_memoized(self):
+        """Test that backgrounds fade between their end colours and are copied from one cached canvas"""
+        first = backgrounds.background_canvas('gradient', (1080, 1920))
+        self.assertEqual(first.size, (1080, 1920))
+        self.assertEqual(first.getpixel((0, 0)), (147, 51, 234))
+        self.assertEqual(first.getpixel((1079, 1919)), (59, 130, 246))
+        
+        first.putpixel((0, 0), (0, 0, 0))
+        second = backgrounds.background_canvas('gradient', (1080, 1920))
+        self.assertEqual(second.getpixel((0, 0)), (147, 51, 234))
+        self.assertGreaterEqual(backgrounds._cached_background.cache_info().hits, 1)
+
+
+class FontRegistryTestCase(TestCase):
+    def test_fonts_loaded_once_per_family_and_size(self):
+        """Test that repeated fallback renders reuse the cached fonts"""
+        image_generation.render_fallback('Mug', 'Calm', 'white', 1080, 1080)
+        with patch.object(fonts.ImageFont, 'truetype') as truetype, \
+                patch.object(fonts.ImageFont, 'load_default') as load_default:
+            img = image_generation.render_fallback('Sneakers', 'Bold', 'white', 1080, 1080)
+        
+        self.assertEqual(truetype.call_count + load_default.call_count, 0)
+        self.assertIs(fonts.get_font('display', 129.6), fonts.get_font('display', 129))
+        # The title's black outline is drawn by the native stroke
+        self.assertIn((0, 0, 0), [color for _, color in img.getcolors(1080 * 1080)])
+
+
+class PosterTemplateTestCase(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        User.objects.create_user(username='seller', password='testpass123')
+        self.client.login(username='seller', password='testpass123')
+
+    def upload(self, name, size, color):
+        buffer = BytesIO()
+        Image.new('RGB', size, color).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def test_every_template_renders(self):
+        """Test that each template renders a full-size poster with the product placed"""
+        for template in posters.TEMPLATES:
+            product = Image.new('RGBA', (2000, 1000), (255, 0, 0, 255))
+            logo = Image.new('RGBA', (400, 400), (0, 255, 0, 255))
+            poster = posters.render_poster(product, logo, 'Fresh red sneakers', template)
+            self.assertEqual(poster.size, posters.POSTER_SIZE)
+            self.assertEqual(poster.getpixel((540, 500)), (255, 0, 0))
+        self.assertGreaterEqual(posters._static_runs.cache_info().currsize, len(posters.TEMPLATES))
+
+    def test_poster_api_pil_fallback(self):
+        """Test that the PIL poster fallback renders and saves a poster"""
+        with self.settings(MEDIA_ROOT=self.media_root), \
+                patch.object(ai_text, 'generate_section', return_value='Caption'):
+            response = self.client.post('/api/generate-poster/', {
+                'product_image': self.upload('product.png', (800, 600), 'red'),
+                'logo_image': self.upload('logo.png', (300, 300), 'blue'),
+                'description': 'Red sneakers',
+                'template': 'bold',
+            })
+        
+        data = response.json()
+        self.assertTrue(data['success'], data)
+        self.assertEqual(data['description'], 'Caption')
+
+
+class ImageUploadTestCase(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        User.objects.create_user(username='seller', password='testpass123')
+        self.client.login(username='seller', password='testpass123')
+
+    def upload(self, name, size, fmt='JPEG'):
+        buffer = BytesIO()
+        Image.new('RGB', size, 'orange').save(buffer, fmt)
+        return SimpleUploadedFile(name, buffer.getvalue())
+
+    def test_open_image_downscales(self):
+        """Test that uploads are decoded no larger than the requested size"""
+        image = uploads.open_image(self.upload('photo.jpg', (4000, 3000)), (1000, 1000), mode='RGBA')
+        self.assertEqual(image.size, (1000, 750))
+        self.assertEqual(image.mode, 'RGBA')
+
+    def test_rejects_bombs_and_garbage(self):
+        """Test that oversized and undecodable uploads raise ValidationError"""
+        with patch.object(uploads, 'MAX_UPLOAD_PIXELS', 1000 * 1000):
+            with self.assertRaises(ValidationError):
+                uploads.open_image(self.upload('huge.jpg', (2000, 2000)), (500, 500))
+        with self.assertRaises(ValidationError):
+            uploads.validate_image_upload(SimpleUploadedFile('fake.jpg', b'not an image'))
+
+    def test_non_jpeg_has_lower_pixel_limit(self):
+        """Test that formats draft() cannot shrink are capped far below the JPEG limit"""
+        with patch.object(uploads, 'MAX_UPLOAD_PIXELS', 4000 * 4000), \
+                patch.object(uploads, 'MAX_UNSCALED_UPLOAD_PIXELS', 1000 * 1000):
+            uploads.validate_image_upload(self.upload('large.jpg', (2000, 2000)))
+            with self.assertRaises(ValidationError):
+                uploads.validate_image_upload(self.upload('large.png', (2000, 2000), 'PNG'))
+
+    def test_create_gig_stores_downscaled_image(self):
+        """Test that gig images are re-encoded at GIG_IMAGE_SIZE"""
+        with self.settings(MEDIA_ROOT=self.media_root):
+            self.client.post('/create-gig/', {
+                'title': 'Logo design', 'description': 'Logos', 'price': '50.00',
+                'delivery_time': 3, 'image': self.upload('photo.png', (3200, 1600), 'PNG'),
+            })
+            gig = Gig.objects.get(title='Logo design')
+            with Image.open(gig.image.path) as stored:
+                self.assertEqual(stored.size, (1600, 800))
+                self.assertEqual(stored.format, 'JPEG')
+
+    def test_poster_api_rejects_invalid_image(self):
+        """Test that the poster API answers 400 for an invalid upload"""
+        response = self.client.post('/api/generate-poster/', {
+            'product_image': SimpleUploadedFile('product.png', b'garbage'),
+            'description': 'Red sneakers',
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.json()['success'])
+
+
+class ContentAddressedStorageTestCase(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+
+    def test_identical_content_stored_once(self):
+        """Test that blobs are named by hash, sharded and deduplicated"""
+        with self.settings(MEDIA_ROOT=self.media_root):
+            first = storage.save_bytes('posters', b'same bytes', '.jpg')
+            second = storage.save_bytes('posters', b'same bytes', '.jpg')
+            other = storage.save_bytes('posters', b'other bytes', '.jpg')
+            
+            self.assertEqual(first, second)
+            self.assertNotEqual(first, other)
+            self.assertRegex(first, r'^/media/posters/([0-9a-f]{2})/([0-9a-f]{2})/\1\2[0-9a-f]{60}\.jpg$')
+            files = [name for _, _, names in os.walk(self.media_root) for name in names]
+            self.assertEqual(len(files), 2)
+
+    def test_fallback_image_saved_by_hash(self):
+        """Test that generated images go through the content-addressed storage"""
+        with self.settings(MEDIA_ROOT=self.media_root), \
+                patch.object(image_generation, 'request_upstream_image', return_value=None):
+            result = image_generation.generate_product_image('key', 'Sneakers', 'bold')
+        
+        self.assertTrue(result['image_url'].startswith('/media/ai_images/'))
+        name = result['image_url'][len('/media/'):]
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, name)))
+
+
+class MediaGarbageCollectorTestCase(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.seller = User.objects.create_user(username='seller', password='testpass123')
+
+    def write(self, name, age_days):
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(b'x' * 1024)
+        stamp = time.time() - age_days * 86400
+        os.utime(path, (stamp, stamp))
+        return path
+
+    def test_gc_media(self):
+        """Test that only unreferenced uploads and expired generated images are removed"""
+        kept = [
+            self.write('gigs/aa/bb/referenced.jpg', 30),
+            self.write('gigs/aa/bb/fresh.jpg', 0),
+            self.write('posters/cc/dd/recent.jpg', 2),
+        ]
+        removed = [
+            self.write('gigs/aa/bb/orphan.jpg', 30),
+            self.write('posters/cc/dd/expired.jpg', 10),
+            self.write('ai_images/ee/ff/expired.jpg', 10),
+        ]
+        Gig.objects.create(seller=self.seller, title='Gig', description='Gig', price=10,
+                           delivery_time=1, image='gigs/aa/bb/referenced.jpg')
+        
+        out = StringIO()
+        with self.settings(MEDIA_ROOT=self.media_root):
+            call_command('gc_media', '--dry-run', stdout=out)
+            self.assertIn('Would remove 3 files', out.getvalue())
+            self.assertTrue(all(os.path.exists(path) for path in removed))
+            
+            call_command('gc_media', '--batch-size', '2', stdout=out)
+        
+        self.assertIn('Removed 3 files', out.getvalue())
+        self.assertTrue(all(os.path.exists(path) for path in kept))
+        self.assertFalse(any(os.path.exists(path) for path in removed))
+
+    def test_update_gig_drops_replaced_image(self):
+        """Test that replacing a gig image deletes the old blob unless another gig shares it"""
+        buffer = BytesIO()
+        Image.new('RGB', (64, 64), 'red').save(buffer, 'PNG')
+        self.client.login(username='seller', password='testpass123')
+        
+        with self.settings(MEDIA_ROOT=self.media_root):
+            gig = Gig.objects.create(seller=self.seller, title='Gig', description='Gig', price=10,
+                                     delivery_time=1, image=SimpleUploadedFile('a.png', buffer.getvalue()))
+            shared = Gig.objects.create(seller=self.seller, title='Twin', description='Gig', price=10,
+                                        delivery_time=1, image=SimpleUploadedFile('b.png', buffer.getvalue()))
+            self.assertEqual(gig.image.name, shared.image.name)
+            
+            for image_gig, color in ((gig, 'blue'), (shared, 'green')):
+                upload = BytesIO()
+                Image.new('RGB', (64, 64), color).save(upload, 'PNG')
+                old_path = image_gig.image.path
+                self.client.post(f'/update-gig/{image_gig.id}/', {
+                    'title': 'Gig', 'description': 'Gig', 'price': '10', 'delivery_time': 1,
+                    'image': SimpleUploadedFile('new.png', upload.getvalue()),
+                })
+                # Still shared after the first update, unreferenced after the second
+                self.assertEqual(os.path.exists(old_path), image_gig is gig)
+
+
+class StubAIHandler(BaseHTTPRequestHandler):
+    """Local stand-in for the OpenRouter chat completions API"""
+    protocol_version = 'HTTP/1.1'
+    responses_to_send = []
+    connections = 0
+
+    def setup(self):
+        super().setup()
+        StubAIHandler.connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        status, body, *delay = StubAIHandler.responses_to_send.pop(0)
+        if delay:
+            time.sleep(delay[0])
+        # A str body is sent as-is as a text/event-stream
+        streamed = isinstance(body, str)
+        payload = body.encode() if streamed else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/event-stream' if streamed else 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        try:
+            self.wfile.write(payload)
+        except BrokenPipeError:
+            # The client gave up first (timeout tests)
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+class StubImageHandler(BaseHTTPRequestHandler):
+    """Serves GET /<name> from `files`: name -> (content type, body)"""
+    files = {}
+
+    def do_GET(self):
+        content_type, body = StubImageHandler.files[self.path.lstrip('/')]
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+class UpstreamImageDownloadTestCase(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubImageHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        buffer = BytesIO()
+        Image.new('RGB', (64, 64), 'red').save(buffer, 'PNG')
+        self.png = buffer.getvalue()
+        StubImageHandler.files = {
+            'image.png': ('image/png', self.png),
+            'page.html': ('text/html', b'<html></html>'),
+            'fake.png': ('image/png', b'<html>not really</html>'),
+        }
+
+    def fetch(self, url):
+        reply = {'choices': [{'message': {'content': [{'type': 'image_url', 'image_url': {'url': url}}]}}]}
+        with self.settings(MEDIA_ROOT=self.media_root), \
+                patch.object(ai_client.AIClient, 'chat_completion', return_value=reply):
+            return image_generation.fetch_upstream_image('key', 'prompt')
+
+    def test_url_and_data_uri_are_stored(self):
+        """Test that both upstream image forms are streamed to storage with a sniffed extension"""
+        data_uri = 'data:image/png;base64,' + base64.b64encode(self.png).decode()
+        for url in (f'{self.base_url}/image.png', data_uri):
+            name = self.fetch(url)
+            self.assertTrue(name.startswith('ai_images/') and name.endswith('.png'), name)
+            with open(os.path.join(self.media_root, name), 'rb') as stored:
+                self.assertEqual(stored.read(), self.png)
+
+    def test_rejects_wrong_type_bad_magic_and_oversize(self):
+        """Test that non-images and oversized images never reach storage"""
+        urls = [
+            f'{self.base_url}/page.html',
+            f'{self.base_url}/fake.png',
+            'data:text/html;base64,' + base64.b64encode(b'<html></html>').decode(),
+            'data:image/png;base64,' + base64.b64encode(b'not a png').decode(),
+        ]
+        for url in urls:
+            with self.assertRaises(image_generation.ImageDownloadError):
+                self.fetch(url)
+        with patch.object(image_generation, 'MAX_IMAGE_BYTES', 100):
+            for url in (f'{self.base_url}/image.png', 'data:image/png;base64,' + base64.b64encode(self.png).decode()):
+                with self.assertRaises(image_generation.ImageDownloadError):
+                    self.fetch(url)
+        self.assertEqual([name for _, _, names in os.walk(self.media_root) for name in names], [])
+
+
+class AIClientTestCase(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubAIHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_port}/api/v1'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def completion(self, text):
+        return 200, {'choices': [{'message': {'content': text}}]}
+
+    def test_retries_then_reuses_connection(self):
+        """Test that a 503 is retried and later calls reuse the pooled connection"""
+        StubAIHandler.connections = 0
+        StubAIHandler.responses_to_send = [(503, {'error': 'busy'}), self.completion('Hi'), self.completion('Again')]
+        client = ai_client.AIClient(self.base_url)
+        
+        with patch.object(ai_client, 'BACKOFF_BASE', 0):
+            first = client.chat_completion('key', 'test-model', [{'role': 'user', 'content': 'Hello'}])
+        second = client.chat_completion('key', 'test-model', [{'role': 'user', 'content': 'Hello'}])
+        
+        self.assertEqual(first['choices'][0]['message']['content'], 'Hi')
+        self.assertEqual(second['choices'][0]['message']['content'], 'Again')
+        self.assertEqual(StubAIHandler.connections, 1)
+        self.assertGreaterEqual(ai_client.latency_stats.snapshot()['test-model']['errors'], 1)
+
+    def test_text_generation_uses_configured_base_url(self):
+        """Test that text generation goes to GEMINI_API_BASE"""
+        caches['ai_content'].clear()
+        StubAIHandler.responses_to_send = [self.completion('Stub caption')]
+        with override_settings(GEMINI_API_BASE=self.base_url):
+            self.assertEqual(ai_text.generate_section('key', 'caption', 'Caption prompt'), 'Stub caption')
+
+    def test_non_retryable_error_raises(self):
+        """Test that a 400 fails immediately"""
+        StubAIHandler.responses_to_send = [(400, {'error': 'bad request'})]
+        client = ai_client.AIClient(self.base_url)
+        with self.assertRaises(ai_client.AIClientError):
+            client.chat_completion('key', 'test-model', [])
+        self.assertEqual(StubAIHandler.responses_to_send, [])
+
+    def test_stream_yields_deltas(self):
+        """Test that a streaming completion yields content deltas and skips comments"""
+        chunks = [{'choices': [{'delta': {'content': text}}]} for text in ('Hel', 'lo')]
+        body = ': OPENROUTER PROCESSING\n\n' + ''.join(f'data: {json.dumps(c)}\n\n' for c in chunks) + 'data: [DONE]\n\n'
+        StubAIHandler.responses_to_send = [(200, body)]
+        client = ai_client.AIClient(self.base_url)
+        self.assertEqual(list(client.stream_chat_completion('key', 'test-model', [])), ['Hel', 'lo'])
+
+    def test_read_timeout_not_retried(self):
+        """Test that a slow generation is not sent twice"""
+        StubAIHandler.responses_to_send = [(200, {'choices': []}, 0.5), self.completion('Duplicate')]
+        client = ai_client.AIClient(self.base_url)
+        with self.assertRaises(ai_client.AIClientError):
+            client.chat_completion('key', 'test-model', [], timeout=0.2)
+        self.assertEqual(len(StubAIHandler.responses_to_send), 1)
+
+    def test_circuit_breaker_opens_and_recovers(self):
+        """Test that repeated upstream failures open the breaker and a half-open probe closes it"""
+        client = ai_client.AIClient(self.base_url)
+        StubAIHandler.responses_to_send = [(500, {'error': 'down'})] * ai_client.BREAKER_MIN_CALLS
+        for _ in range(ai_client.BREAKER_MIN_CALLS):
+            with self.assertRaises(ai_client.AIClientError):
+                client.chat_completion('key', 'test-model', [], max_retries=0)
+        
+        # Open: rejected without a request
+        StubAIHandler.responses_to_send = [self.completion('Recovered')]
+        with self.assertRaises(ai_client.CircuitOpenError):
+            client.chat_completion('key', 'test-model', [])
+        self.assertEqual(len(StubAIHandler.responses_to_send), 1)
+        
+        # After the cool-down one probe goes through and closes the breaker
+        client.breaker('test-model').open_seconds = 0
+        result = client.chat_completion('key', 'test-model', [])
+        self.assertEqual(result['choices'][0]['message']['content'], 'Recovered')
+        self.assertEqual(client.breaker('test-model').snapshot()['state'], 'closed')
+
+    def test_client_errors_do_not_open_breaker(self):
+        """Test that 4xx responses other than 429 do not count against the upstream"""
+        client = ai_client.AIClient(self.base_url)
+        StubAIHandler.responses_to_send = [(400, {'error': 'bad request'})] * ai_client.BREAKER_MIN_CALLS
+        for _ in range(ai_client.BREAKER_MIN_CALLS):
+            with self.assertRaises(ai_client.AIClientError):
+                client.chat_completion('key', 'test-model', [])
+        self.assertEqual(client.breaker('test-model').snapshot()['state'], 'closed')
+
+    def test_open_breaker_falls_back_immediately(self):
+        """Test that text generation skips a tripped upstream and returns the fallback at once"""
+        caches['ai_content'].clear()
+        # The shared client outlives this test; don't leave its breaker open
+        shared = ai_client.get_client(self.base_url)
+        self.addCleanup(shared.breakers.clear)
+        with override_settings(GEMINI_API_BASE=self.base_url):
+            shared.breaker(ai_text.TEXT_MODEL).trip()
+            started = time.monotonic()
+            text = ai_text.generate_section('key', 'caption', 'Caption prompt')
+        self.assertEqual(text, ai_text.SECTION_FALLBACKS['caption'])
+        self.assertLess(time.monotonic() - started, 0.5)
+
+    def test_stats_endpoint_requires_admin(self):
+        """Test that AI call metrics are only shown to admins"""
+        User.objects.create_user(username='buyer', password='testpass123')
+        self.client.login(username='buyer', password='testpass123')
+        self.assertEqual(self.client.get('/api/ai-stats/').status_code, 403)
+        
+        User.objects.create_user(username='staff', password='testpass123', is_staff=True)
+        self.client.post('/admin/login/', {'username': 'staff', 'password': 'testpass123'})
+        data = self.client.get('/api/ai-stats/').json()
+        self.assertIn('latency', data)
+        self.assertIn('breakers', data)
+        self.assertIn('text_cache', data)
@@ -0,0 +1,91 @@
+"""
+Memory-bounded ingest of uploaded images (poster inputs, gig images and
+profile pictures).
+
+Pillow's Image.open only reads the header, so the pixel count is checked
+before anything is decoded and decompression bombs are rejected up front.
+Decoding then goes through open_image(), which asks the JPEG decoder for a
+reduced-scale draft close to the target size and thumbnails before any
+colour conversion, so a 50-megapixel phone photo is never expanded to full
+resolution (or to 4 bytes per pixel) in memory.
+"""
+import io
+import os
+
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+# JPEGs are draft-decoded at up to 1/8 scale, so a large one costs little.
+# Other formats (PNG, WebP, ...) are always decoded at full size, at up to
+# 4 bytes per pixel, so they get a much lower limit (~48 MB of RGBA).
+MAX_UPLOAD_PIXELS = 64_000_000
+MAX_UNSCALED_UPLOAD_PIXELS = 12_000_000
+DRAFT_FORMATS = {'JPEG', 'MPO'}
+
+GIG_IMAGE_SIZE = (1600, 1600)
+PROFILE_PICTURE_SIZE = (512, 512)
+
+
+def _open_header(uploaded):
+    """Open an upload lazily and check its size and pixel count"""
+    size = getattr(uploaded, 'size', None)
+    if size is not None and size > MAX_UPLOAD_BYTES:
+        raise ValidationError(f'Image files must be smaller than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB.')
+    if hasattr(uploaded, 'seek'):
+        uploaded.seek(0)
+    try:
+        image = Image.open(uploaded)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        raise ValidationError('Upload a valid image.')
+    limit = MAX_UPLOAD_PIXELS if image.format in DRAFT_FORMATS else MAX_UNSCALED_UPLOAD_PIXELS
+    if image.width * image.height > limit:
+        raise ValidationError('Image dimensions are too large.')
+    return image
+
+
+def validate_image_upload(uploaded):
+    """Model field validator: reject oversized files and decompression bombs without decoding"""
+    if getattr(uploaded, '_committed', False):
+        # Already in storage (e.g. an unchanged field in an admin form)
+        return
+    _open_header(uploaded)
+    if hasattr(uploaded, 'seek'):
+        uploaded.seek(0)
+
+
+def open_image(uploaded, max_size, mode='RGB'):
+    """
+    Decode an upload to at most `max_size` pixels and return it in `mode`.
+    Raises ValidationError for invalid, oversized or bomb images.
+    """
+    image = _open_header(uploaded)
+    try:
+        # JPEG: decode at 1/2, 1/4 or 1/8 scale when that is still >= max_size
+        image.draft(None, max_size)
+        if image.mode == 'P':
+            # Palette images cannot be resampled; expand first (they are small in practice)
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+        image.thumbnail(max_size, Image.Resampling.LANCZOS)
+        image = ImageOps.exif_transpose(image)
+        return image.convert(mode) if image.mode != mode else image
+    except (OSError, ValueError, Image.DecompressionBombError):
+        raise ValidationError('Upload a valid image.')
+
+
+def ingest_upload(uploaded, max_size):
+    """
+    Decode an upload with open_image() and re-encode it (JPEG, or PNG when it
+    has transparency) as a ContentFile ready to assign to an ImageField.
+    """
+    image = open_image(uploaded, max_size, mode='RGBA')
+    stem = os.path.splitext(os.path.basename(getattr(uploaded, 'name', '') or 'image'))[0]
+    buffer = io.BytesIO()
+    if image.getextrema()[3][0] < 255:
+        image.save(buffer, 'PNG', optimize=True)
+        name = f'{stem}.png'
+    else:
+        image.convert('RGB').save(buffer, 'JPEG', quality=90, optimize=True)
+        name = f'{stem}.jpg'
+    return ContentFile(buffer.getvalue(), name=name)
@@ -26,6 +26,7 @@ urlpatterns = [
     path('api/conversations/', views.get_conversations_json, name='api-conversations'),
     path('api/orders/<int:order_id>/messages/', views.get_order_messages_json, name='api-order-messages'),
     path('api/orders/<int:order_id>/send-message/', views.send_message_json, name='api-send-message'),
+    path('api/messages/search/', views.search_messages_json, name='api-message-search'),
     path('api/gigs/<int:gig_id>/', views.get_gig_detail_json, name='api-gig-detail'),
     path('api/orders/create/', views.create_order_json, name='api-order-create'),
     path('api/orders/buyer/', views.get_buyer_orders_json, name='api-buyer-orders'),
@@ -40,5 +41,34 @@ urlpatterns = [
     path('api/cashout-requests/', views.get_cashout_requests, name='api-cashout-requests'),
     path('api/available-earnings/', views.get_available_earnings, name='api-available-earnings'),
     path('api/generate-text-content/', views.generate_text_content, name='api-generate-text-content'),
+    path('api/generate-text-content/stream/', views.generate_text_content_stream, name='api-generate-text-content-stream'),
     path('api/generate-product-image/', views.generate_product_image, name='api-generate-product-image'),
+    path('api/generate-product-images/', views.generate_product_image_set, name='api-generate-product-images'),
+    path('api/image-jobs/', views.submit_image_job, name='api-image-job-submit'),
+    path('api/image-jobs/<int:job_id>/', views.get_image_job, name='api-image-job'),
+    path('api/ai-stats/', views.ai_stats_json, name='api-ai-stats'),
 ]
+
+# Token-bucket limits per URL name, as '<requests>/<s|m|h>'.
+# Applied per signed-in user (or per IP for anonymous clients) by
+# marketplace.middleware.RateLimitMiddleware.
+RATE_LIMITS = {
+    # AI generation: each call ties up a worker on an upstream request
+    'api-generate-text-content': '10/m',
+    'api-generate-text-content-stream': '10/m',
+    'api-generate-product-image': '5/m',
+    'api-generate-poster': '5/m',
+    # One ad set is up to 4 formats x MAX_VARIATIONS images
+    'api-generate-product-images': '2/m',
+    'api-image-job-submit': '5/m',
+    'api-order-create': '20/m',
+    'api-message-search': '30/m',
+    # Polling endpoints hit by main.js every few seconds from each open tab
+    'api-notifications': '120/m',
+    'api-conversations': '120/m',
+    'api-user-balance': '120/m',
+    'api-order-messages': '120/m',
+    'api-buyer-orders': '120/m',
+    'api-seller-orders': '120/m',
+    'api-image-job': '120/m',
+}
@@ -1,5 +1,5 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth import authenticate, login as auth_login, logout as auth_logout
@@ -7,15 +7,21 @@ from django.contrib.auth.models import User
 from django.contrib import messages
 from django.db import transaction
 from django.utils import timezone
-from .models import Gig, Order, UserProfile, Category, Transaction, Message, BalanceRequest, CashoutRequest
+from .models import (
+    Gig, Order, UserProfile, Category, Transaction, Message, Conversation, BalanceRequest, CashoutRequest,
+    ArchivedMessage, ArchivedNotification, ImageGenerationJob, media_is_referenced
+)
 import json
-import os
-import requests
 from django.conf import settings
-from PIL import Image, ImageDraw, ImageFont, ImageFilter, ImageEnhance
 import io
 from django.core.files.base import ContentFile
 from openai import OpenAI
+from .search import index_message, search_messages
+from . import notifications
+from . import ai_text, image_generation, posters, storage, uploads
+from django.core.exceptions import ValidationError
+from .ai_client import breaker_states, latency_stats
+from .auth_cache import resolve_admin_user
 
 def home(request):
     """Render the home page (HTML skeleton)"""
@@ -265,8 +271,7 @@ def create_order_json(request):
             )
             
             # Create notification for seller
-            from .models import Notification
-            Notification.objects.create(
+            notifications.notify(
                 user=gig.seller,
                 notification_type='order_placed',
                 title='New Order Received',
@@ -369,6 +374,8 @@ def create_gig(request):
         image = request.FILES.get('image')
         
         try:
+            if image:
+                image = uploads.ingest_upload(image, uploads.GIG_IMAGE_SIZE)
             category = Category.objects.get(id=category_id) if category_id else None
             
             gig = Gig.objects.create(
@@ -388,6 +395,8 @@ def create_gig(request):
             
             messages.success(request, 'Gig created successfully!')
             return redirect('dashboard')
+        except ValidationError as e:
+            messages.error(request, f'Error creating gig: {e.messages[0]}')
         except Exception as e:
             messages.error(request, f'Error creating gig: {str(e)}')
     
@@ -407,13 +416,21 @@ def update_gig(request, gig_id):
         gig.delivery_time = request.POST.get('delivery_time')
         
         # Update image if new one is provided
+        old_image = gig.image.name
         if request.FILES.get('image'):
-            gig.image = request.FILES.get('image')
+            try:
+                gig.image = uploads.ingest_upload(request.FILES.get('image'), uploads.GIG_IMAGE_SIZE)
+            except ValidationError as e:
+                messages.error(request, f'Error updating gig: {e.messages[0]}')
+                return redirect('update-gig', gig_id=gig.id)
         
         if category_id:
             gig.category = Category.objects.get(id=category_id)
         
         gig.save()
+        # The replaced blob may be shared with identical uploads; only drop it when unreferenced
+        if old_image and old_image != gig.image.name and not media_is_referenced(old_image):
+            gig.image.storage.delete(old_image)
         messages.success(request, 'Gig updated successfully!')
         return redirect('dashboard')
     
@@ -426,7 +443,9 @@ def update_gig(request, gig_id):
 @login_required
 def imagine_view(request):
     """Render the AI poster generator page"""
-    return render(request, 'marketplace/imagine.html')
+    return render(request, 'marketplace/imagine.html', {
+        'use_image_jobs': getattr(settings, 'IMAGE_JOB_QUEUE', False)
+    })
 
 @login_required
 def generate_poster_api(request):
@@ -438,49 +457,29 @@ def generate_poster_api(request):
         product_image = request.FILES.get('product_image')
         logo_image = request.FILES.get('logo_image')
         description = request.POST.get('description', '')
+        template = request.POST.get('template', posters.DEFAULT_TEMPLATE)
         
         if not product_image or not description:
             return JsonResponse({'success': False, 'error': 'Product image and description are required'}, status=400)
         
+        if template not in posters.TEMPLATES:
+            return JsonResponse({'success': False, 'error': 'Invalid template'}, status=400)
+        
+        try:
+            for upload in (product_image, logo_image):
+                if upload:
+                    uploads.validate_image_upload(upload)
+        except ValidationError as e:
+            return JsonResponse({'success': False, 'error': e.messages[0]}, status=400)
+        
         # Configure Gemini API for caption generation
         gemini_key = getattr(settings, 'GEMINI_API_KEY', None)
         if not gemini_key:
             return JsonResponse({'success': False, 'error': 'API key not configured'}, status=500)
         
-        # Step 1: Generate AI caption using Gemini
-        caption_prompt = f"""Create a catchy, engaging social media caption for a poster with this description: {description}
-        
-        Requirements:
-        - Make it short and punchy (2-3 sentences max)
-        - Include relevant emojis
-        - Add 3-5 relevant hashtags at the end
-        - Make it shareable and attention-grabbing
-        - Focus on benefits and call-to-action"""
-        
-        try:
-            response = requests.post(
-                'https://openrouter.ai/api/v1/chat/completions',
-                headers={
-                    'Authorization': f'Bearer {gemini_key}',
-                    'HTTP-Referer': 'https://adezy.com',
-                    'X-Title': 'AdEzy AI Generator',
-                    'Content-Type': 'application/json'
-                },
-                json={
-                    'model': 'google/gemini-2.0-flash-exp:free',
-                    'messages': [{'role': 'user', 'content': caption_prompt}]
-                },
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                ai_caption = result['choices'][0]['message']['content']
-            else:
-                ai_caption = "Check out this amazing product! 🌟 #ad #product #amazing"
-        except Exception as e:
-            print(f"Caption generation error: {e}")
-            ai_caption = "Check out this amazing product! 🌟 #ad #product #amazing"
+        # Step 1: Generate AI caption using Gemini (cached by prompt)
+        caption_prompt = ai_text.POSTER_CAPTION_PROMPT.format(description=description)
+        ai_caption = ai_text.generate_section(gemini_key, 'poster_caption', caption_prompt)
         
         # Step 2: Generate poster image using Seedream
         api_key = getattr(settings, 'SEEDREAM_API_KEY', None)
@@ -540,23 +539,12 @@ Design Requirements:
         
         if not generated_image_data:
             # Fallback to PIL-based generation if AI generation fails
-            poster = create_poster_image(product_image, logo_image, description)
-            poster_filename = f'poster_{request.user.id}_{timezone.now().timestamp()}.jpg'
-            poster_path = os.path.join(settings.MEDIA_ROOT, 'posters', poster_filename)
-            os.makedirs(os.path.dirname(poster_path), exist_ok=True)
-            poster.save(poster_path, 'JPEG', quality=95)
+            poster = create_poster_image(product_image, logo_image, description, template)
+            poster_url = storage.save_image(posters.POSTER_NAMESPACE, poster, 'JPEG', quality=95)
         else:
             # Save the AI-generated poster
             import base64
-            poster_filename = f'poster_{request.user.id}_{timezone.now().timestamp()}.jpg'
-            poster_path = os.path.join(settings.MEDIA_ROOT, 'posters', poster_filename)
-            os.makedirs(os.path.dirname(poster_path), exist_ok=True)
-            
-            # Decode and save the image
-            with open(poster_path, 'wb') as f:
-                f.write(base64.b64decode(generated_image_data))
-        
-        poster_url = os.path.join(settings.MEDIA_URL, 'posters', poster_filename)
+            poster_url = storage.save_bytes(posters.POSTER_NAMESPACE, base64.b64decode(generated_image_data), '.jpg')
         
         return JsonResponse({
             'success': True,
@@ -570,69 +558,12 @@ Design Requirements:
         print(f"Error generating poster: {error_details}")
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
-def create_poster_image(product_image, logo_image, description):
-    """Create a beautiful poster with product image and logo"""
-    # Open product image
-    product = Image.open(product_image).convert('RGBA')
-    
-    # Create canvas (Instagram square format)
-    canvas_width, canvas_height = 1080, 1080
-    canvas = Image.new('RGB', (canvas_width, canvas_height), '#ffffff')
-    
-    # Resize product image to fit nicely
-    product_width = int(canvas_width * 0.8)
-    product_height = int(canvas_height * 0.7)
-    product.thumbnail((product_width, product_height), Image.Resampling.LANCZOS)
-    
-    # Calculate position to center product
-    product_x = (canvas_width - product.width) // 2
-    product_y = (canvas_height - product.height) // 2 - 50
-    
-    # Create gradient background
-    draw = ImageDraw.Draw(canvas)
-    for i in range(canvas_height):
-        alpha = i / canvas_height
-        r = int(255 * (1 - alpha) + 240 * alpha)
-        g = int(250 * (1 - alpha) + 200 * alpha)
-        b = int(255 * (1 - alpha) + 150 * alpha)
-        draw.rectangle([(0, i), (canvas_width, i+1)], fill=(r, g, b))
-    
-    # Add shadow behind product
-    shadow = Image.new('RGBA', product.size, (0, 0, 0, 0))
-    shadow_draw = ImageDraw.Draw(shadow)
-    shadow_draw.rectangle([0, 0, product.width, product.height], fill=(0, 0, 0, 100))
-    shadow = shadow.blur_image(shadow, 20)
-    canvas.paste(shadow, (product_x + 10, product_y + 10), shadow)
-    
-    # Paste product image
-    if product.mode == 'RGBA':
-        canvas.paste(product, (product_x, product_y), product)
-    else:
-        canvas.paste(product, (product_x, product_y))
-    
-    # Add logo if provided
-    if logo_image:
-        logo = Image.open(logo_image).convert('RGBA')
-        logo_size = 150
-        logo.thumbnail((logo_size, logo_size), Image.Resampling.LANCZOS)
-        logo_x = canvas_width - logo.width - 40
-        logo_y = 40
-        canvas.paste(logo, (logo_x, logo_y), logo)
-    
-    # Add decorative elements
-    draw = ImageDraw.Draw(canvas)
-    
-    # Top banner
-    draw.rectangle([(0, 0), (canvas_width, 100)], fill=(16, 24, 40, 200))
-    
-    # Bottom banner
-    draw.rectangle([(0, canvas_height - 100), (canvas_width, canvas_height)], fill=(16, 24, 40, 200))
-    
-    return canvas
-
-def blur_image(image, radius):
-    """Apply blur filter to image"""
-    return image.filter(ImageFilter.GaussianBlur(radius))
+def create_poster_image(product_image, logo_image, description, template=posters.DEFAULT_TEMPLATE):
+    """Create a poster with product image and logo from a layered template"""
+    # Inputs are decoded no larger than the poster needs; see marketplace.uploads
+    product = uploads.open_image(product_image, posters.POSTER_SIZE, mode='RGBA')
+    logo = uploads.open_image(logo_image, posters.LOGO_INPUT_SIZE, mode='RGBA') if logo_image else None
+    return posters.render_poster(product, logo, description, template)
 
 @login_required
 def get_my_gigs_json(request):
@@ -713,7 +644,6 @@ def update_order_status_json(request, order_id):
         order.save()
         
         # Create notification
-        from .models import Notification
         notification_messages = {
             'in_progress': f"Your order for {order.gig.title} has been accepted and is now in progress",
             'delivered': f"Your order for {order.gig.title} has been delivered. Please review and complete.",
@@ -732,7 +662,7 @@ def update_order_status_json(request, order_id):
         if new_status in notification_types:
             # For completion, notify seller; for others, notify buyer
             recipient = order.seller if new_status == 'completed' else order.buyer
-            Notification.objects.create(
+            notifications.notify(
                 user=recipient,
                 notification_type=notification_types[new_status],
                 title=f"Order {new_status.replace('_', ' ').title()}",
@@ -762,14 +692,14 @@ def order_detail(request, order_id):
         messages.error(request, 'You do not have permission to view this order')
         return redirect('dashboard')
     
-    # Mark messages as read
-    Message.objects.filter(order=order).exclude(sender=request.user).update(is_read=True)
-    
-    order_messages = order.messages.all()
+    # Only the most recent window is rendered; older history is loaded on demand
+    order_messages, has_more = get_message_window(order)
+    mark_messages_read(order, order_messages, request.user)
     
     return render(request, 'marketplace/order_detail.html', {
         'order': order,
-        'order_messages': order_messages
+        'order_messages': order_messages,
+        'has_more_messages': has_more or ArchivedMessage.objects.filter(order=order).exists()
     })
 
 @login_required
@@ -795,11 +725,25 @@ def send_message_json(request, order_id):
                 'error': 'You do not have permission to message this order'
             }, status=403)
         
-        message = Message.objects.create(
-            order=order,
-            sender=request.user,
-            message=message_text
-        )
+        with transaction.atomic():
+            message = Message.objects.create(
+                order=order,
+                sender=request.user,
+                message=message_text
+            )
+            Conversation.record_message(message)
+            index_message(message)
+            
+            # Notify the other party; a burst of messages shares one notification
+            recipient = order.seller if request.user.id == order.buyer_id else order.buyer
+            notifications.notify(
+                user=recipient,
+                notification_type='message_received',
+                title=f"New message from {request.user.username}",
+                message=Conversation.make_snippet(message_text),
+                order=order,
+                coalesce=True
+            )
         
         return JsonResponse({
             'success': True,
@@ -817,24 +761,33 @@ def send_message_json(request, order_id):
 
 @login_required
 def get_notifications_json(request):
-    """Get all notifications for the current user"""
+    """
+    Get the latest notifications for the current user
+    Query Parameters:
+    - archived: set to 1 to list notifications moved to cold storage
+    """
     from .models import Notification
     
-    notifications = Notification.objects.filter(user=request.user)[:20]
+    if request.GET.get('archived') == '1':
+        latest = ArchivedNotification.objects.filter(user=request.user)[:20]
+    else:
+        latest = Notification.objects.filter(user=request.user)[:20]
     
     notifications_data = []
-    for notif in notifications:
+    for notif in latest:
         notifications_data.append({
             'id': notif.id,
             'type': notif.notification_type,
             'title': notif.title,
             'message': notif.message,
             'is_read': notif.is_read,
+            'count': notif.count,
             'created_at': notif.created_at.isoformat(),
-            'order_id': notif.order.id if notif.order else None
+            'updated_at': notif.updated_at.isoformat(),
+            'order_id': notif.order_id
         })
     
-    unread_count = Notification.objects.filter(user=request.user, is_read=False).count()
+    unread_count = notifications.get_unread_count(request.user)
     
     return JsonResponse({
         'notifications': notifications_data,
@@ -847,9 +800,7 @@ def mark_notification_read_json(request, notification_id):
     from .models import Notification
     
     try:
-        notification = Notification.objects.get(id=notification_id, user=request.user)
-        notification.is_read = True
-        notification.save()
+        notifications.mark_read(request.user, notification_id)
         
         return JsonResponse({'success': True})
     except Notification.DoesNotExist:
@@ -858,45 +809,34 @@ def mark_notification_read_json(request, notification_id):
 @login_required
 def mark_all_notifications_read_json(request):
     """Mark all notifications as read"""
-    from .models import Notification
-    
-    Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+    notifications.mark_all_read(request.user)
     
     return JsonResponse({'success': True})
 
 @login_required
 def get_conversations_json(request):
     """Get all conversations (orders with messages) for the current user"""
-    from django.db.models import Q, Count, Max
+    from django.db.models import Q
     
-    # Get orders where user is buyer or seller and has messages
-    orders = Order.objects.filter(
+    # One indexed query over the per-order summaries, newest activity first
+    summaries = Conversation.objects.filter(
         Q(buyer=request.user) | Q(seller=request.user)
-    ).annotate(
-        message_count=Count('messages'),
-        last_message_time=Max('messages__created_at')
-    ).filter(message_count__gt=0).order_by('-last_message_time')
+    ).select_related('order__gig', 'buyer', 'seller').order_by('-last_message_at')
     
     conversations = []
-    for order in orders:
-        # Get last message
-        last_message = order.messages.last()
-        
-        # Count unread messages
-        unread_count = order.messages.filter(
-            is_read=False
-        ).exclude(sender=request.user).count()
+    for summary in summaries:
+        order = summary.order
         
         # Determine the other party
-        other_user = order.seller if request.user == order.buyer else order.buyer
+        other_user = summary.seller if request.user.id == summary.buyer_id else summary.buyer
         
         conversations.append({
             'order_id': order.id,
             'gig_title': order.gig.title if order.gig else 'Order #' + str(order.id),
             'other_user': other_user.username,
-            'last_message': last_message.message[:50] + ('...' if len(last_message.message) > 50 else ''),
-            'last_message_time': last_message.created_at.isoformat(),
-            'unread_count': unread_count,
+            'last_message': summary.last_message_snippet,
+            'last_message_time': summary.last_message_at.isoformat(),
+            'unread_count': summary.unread_for(request.user),
             'status': order.status
         })
     
@@ -905,36 +845,116 @@ def get_conversations_json(request):
         'total_unread': sum(c['unread_count'] for c in conversations)
     })
 
+MESSAGE_PAGE_SIZE = 50
+
+
+def get_message_window(order, after_id=None, before_id=None, limit=MESSAGE_PAGE_SIZE, model=Message):
+    """
+    Return a window of an order's messages in chronological order.
+    - after_id: only messages newer than this id (polling)
+    - before_id: the page of messages just older than this id (history)
+    - neither: the most recent page
+    Returns (messages, has_more) where has_more tells whether older
+    messages exist beyond the window (always False for after_id polls).
+    Each window is a single range scan on the (order, id) index.
+    Pass model=ArchivedMessage to read from cold storage.
+    """
+    queryset = model.objects.filter(order=order).select_related('sender')
+    
+    if after_id is not None:
+        window = list(queryset.filter(id__gt=after_id).order_by('id')[:limit])
+        return window, False
+    
+    if before_id is not None:
+        queryset = queryset.filter(id__lt=before_id)
+    
+    window = list(queryset.order_by('-id')[:limit + 1])
+    has_more = len(window) > limit
+    window = window[:limit]
+    window.reverse()
+    return window, has_more
+
+
+def mark_messages_read(order, window, user):
+    """
+    Mark the other party's messages as read, up to the newest unread one in
+    the window. Skips the write entirely when the window has nothing unread.
+    """
+    unread_ids = [msg.id for msg in window if not msg.is_read and msg.sender_id != user.id]
+    if not unread_ids:
+        return
+    
+    with transaction.atomic():
+        marked = Message.objects.filter(
+            order=order,
+            is_read=False,
+            id__lte=max(unread_ids)
+        ).exclude(sender=user).update(is_read=True)
+        Conversation.record_read(order, user, marked)
+
+
 @login_required
 def get_order_messages_json(request, order_id):
-    """Get all messages for an order"""
-    order = get_object_or_404(Order, id=order_id)
+    """
+    Get a window of messages for an order
+    URL: /api/orders/<id>/messages/
+    Query Parameters:
+    - after_id: return only messages newer than this id (for polling)
+    - before_id: return the page of messages older than this id (load older)
+    - limit: page size (default 50, max 100)
+    - archived: set to 1 to read messages moved to cold storage
+    """
+    order = get_object_or_404(Order.objects.select_related('gig', 'buyer', 'seller'), id=order_id)
     
     # Check if user is buyer or seller
-    if request.user != order.buyer and request.user != order.seller:
+    if request.user.id != order.buyer_id and request.user.id != order.seller_id:
         return JsonResponse({
             'success': False,
             'error': 'You do not have permission to view these messages'
         }, status=403)
     
-    # Mark messages as read
-    order.messages.filter(is_read=False).exclude(sender=request.user).update(is_read=True)
+    try:
+        after_id = request.GET.get('after_id')
+        after_id = int(after_id) if after_id else None
+        before_id = request.GET.get('before_id')
+        before_id = int(before_id) if before_id else None
+        limit = min(max(int(request.GET.get('limit', MESSAGE_PAGE_SIZE)), 1), 100)
+    except ValueError:
+        return JsonResponse({
+            'success': False,
+            'error': 'after_id, before_id and limit must be integers'
+        }, status=400)
+    
+    archived = request.GET.get('archived') == '1'
+    if archived:
+        window, has_more = get_message_window(
+            order, after_id=after_id, before_id=before_id, limit=limit, model=ArchivedMessage
+        )
+    else:
+        window, has_more = get_message_window(order, after_id=after_id, before_id=before_id, limit=limit)
+        mark_messages_read(order, window, request.user)
     
     messages_data = []
-    for msg in order.messages.all():
+    for msg in window:
         messages_data.append({
             'id': msg.id,
             'sender': msg.sender.username,
             'message': msg.message,
             'created_at': msg.created_at.isoformat(),
-            'is_own': msg.sender == request.user
+            'is_own': msg.sender_id == request.user.id
         })
     
     # Get order details
-    other_user = order.seller if request.user == order.buyer else order.buyer
+    other_user = order.seller if request.user.id == order.buyer_id else order.buyer
     
     return JsonResponse({
         'messages': messages_data,
+        'has_more': has_more,
+        # Only checked when the live history has been paged to its start
+        'has_archived': (
+            not archived and after_id is None and not has_more
+            and ArchivedMessage.objects.filter(order=order).exists()
+        ),
         'order_info': {
             'id': order.id,
             'gig_title': order.gig.title if order.gig else 'Order #' + str(order.id),
@@ -945,6 +965,47 @@ def get_order_messages_json(request, order_id):
     })
 
 
+@login_required
+def search_messages_json(request):
+    """
+    API endpoint: Search messages in the current user's orders
+    URL: /api/messages/search/
+    Query Parameters:
+    - q: search terms
+    - page: result page (default 1, 20 results per page)
+    """
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'success': False, 'error': 'Search query is required'}, status=400)
+    
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Page must be an integer'}, status=400)
+    
+    hits, terms, has_more = search_messages(request.user, query, page=page)
+    
+    results = []
+    for msg in hits:
+        order = msg.order
+        results.append({
+            'message_id': msg.id,
+            'order_id': order.id,
+            'gig_title': order.gig.title if order.gig else 'Order #' + str(order.id),
+            'sender': msg.sender.username,
+            'snippet': msg.search_snippet,
+            'created_at': msg.created_at.isoformat(),
+            'is_own': msg.sender_id == request.user.id
+        })
+    
+    return JsonResponse({
+        'results': results,
+        'terms': terms,
+        'page': page,
+        'has_more': has_more
+    })
+
+
 def get_categories_json(request):
     """
     API endpoint: Get all categories
@@ -1184,165 +1245,32 @@ def generate_text_content(request):
         gen_hashtags = data.get('gen_hashtags', False)
         gen_cta = data.get('gen_cta', False)
         gen_hooks = data.get('gen_hooks', False)
+        mode = data.get('mode') or getattr(settings, 'AI_TEXT_MODE', 'multi')
         
         if not product_desc:
             return JsonResponse({'success': False, 'error': 'Product description is required'}, status=400)
         
+        if mode not in ai_text.MODES:
+            return JsonResponse({'success': False, 'error': 'Invalid mode'}, status=400)
+        
         # Configure Gemini API for text generation
         api_key = getattr(settings, 'GEMINI_API_KEY', None)
         if not api_key:
             return JsonResponse({'success': False, 'error': 'API key not configured'}, status=500)
         
-        content = {}
-        
-        # Generate Caption
-        if gen_caption:
-            caption_prompt = f"""Create an engaging social media caption for {platform} with these details:
-Product: {product_desc}
-Target Audience: {target_audience or 'general audience'}
-
-Requirements:
-- Make it catchy and attention-grabbing
-- 2-3 sentences max
-- Include relevant emojis naturally
-- Focus on benefits and emotional appeal
-- Platform-appropriate tone for {platform}
-- End with a subtle call-to-action
-
-Return only the caption, nothing else."""
-            
-            response = requests.post(
-                'https://openrouter.ai/api/v1/chat/completions',
-                headers={
-                    'Authorization': f'Bearer {api_key}',
-                    'HTTP-Referer': 'https://adezy.com',
-                    'X-Title': 'AdEzy AI Generator',
-                    'Content-Type': 'application/json'
-                },
-                json={
-                    'model': 'google/gemini-2.0-flash-exp:free',
-                    'messages': [{'role': 'user', 'content': caption_prompt}]
-                },
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                content['caption'] = result['choices'][0]['message']['content'].strip()
-            else:
-                print(f"Caption API Error: {response.status_code}, {response.text}")
-                content['caption'] = "Unable to generate caption at this time."
-        
-        # Generate Hashtags
-        if gen_hashtags:
-            hashtags_prompt = f"""Generate relevant hashtags for this product on {platform}:
-Product: {product_desc}
-Target Audience: {target_audience or 'general audience'}
-
-Requirements:
-- Mix of popular and niche hashtags
-- 10-15 hashtags
-- Include branded, category, and trending hashtags
-- Platform-appropriate for {platform}
-- Format: #hashtag1 #hashtag2 #hashtag3 etc.
-
-Return only the hashtags separated by spaces, nothing else."""
-            
-            response = requests.post(
-                'https://openrouter.ai/api/v1/chat/completions',
-                headers={
-                    'Authorization': f'Bearer {api_key}',
-                    'HTTP-Referer': 'https://adezy.com',
-                    'X-Title': 'AdEzy AI Generator',
-                    'Content-Type': 'application/json'
-                },
-                json={
-                    'model': 'google/gemini-2.0-flash-exp:free',
-                    'messages': [{'role': 'user', 'content': hashtags_prompt}]
-                },
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                content['hashtags'] = result['choices'][0]['message']['content'].strip()
-            else:
-                print(f"Hashtags API Error: {response.status_code}, {response.text}")
-                content['hashtags'] = "#marketing #business #product"
-        
-        # Generate Call to Action
-        if gen_cta:
-            cta_prompt = f"""Create 3 powerful call-to-action lines for {platform} promoting:
-Product: {product_desc}
-Target Audience: {target_audience or 'general audience'}
-
-Requirements:
-- Action-oriented and urgent
-- One line each (separate with line breaks)
-- Include emojis
-- Create FOMO (fear of missing out)
-- Platform-appropriate for {platform}
-
-Return only the 3 CTA lines, nothing else."""
-            
-            response = requests.post(
-                'https://openrouter.ai/api/v1/chat/completions',
-                headers={
-                    'Authorization': f'Bearer {api_key}',
-                    'HTTP-Referer': 'https://adezy.com',
-                    'X-Title': 'AdEzy AI Generator',
-                    'Content-Type': 'application/json'
-                },
-                json={
-                    'model': 'google/gemini-2.0-flash-exp:free',
-                    'messages': [{'role': 'user', 'content': cta_prompt}]
-                },
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                content['cta'] = result['choices'][0]['message']['content'].strip()
-            else:
-                print(f"CTA API Error: {response.status_code}, {response.text}")
-                content['cta'] = "🔥 Get yours now!\n💥 Limited time offer!\n✨ Don't miss out!"
-        
-        # Generate Hook Lines
-        if gen_hooks:
-            hooks_prompt = f"""Create 5 attention-grabbing hook lines to start a {platform} post about:
-Product: {product_desc}
-Target Audience: {target_audience or 'general audience'}
-
-Requirements:
-- Make people stop scrolling
-- Question-based or surprising statements
-- One line each (separate with line breaks)
-- Include emojis where appropriate
-- Curiosity-driven
-
-Return only the 5 hook lines, nothing else."""
-            
-            response = requests.post(
-                'https://openrouter.ai/api/v1/chat/completions',
-                headers={
-                    'Authorization': f'Bearer {api_key}',
-                    'HTTP-Referer': 'https://adezy.com',
-                    'X-Title': 'AdEzy AI Generator',
-                    'Content-Type': 'application/json'
-                },
-                json={
-                    'model': 'google/gemini-2.0-flash-exp:free',
-                    'messages': [{'role': 'user', 'content': hooks_prompt}]
-                },
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                content['hooks'] = result['choices'][0]['message']['content'].strip()
-            else:
-                print(f"Hooks API Error: {response.status_code}, {response.text}")
-                content['hooks'] = "🤔 Want to know a secret?\n💡 What if I told you...\n🎯 Ready to transform your life?\n⚡ This changes everything!\n🌟 You won't believe this!"
+        # Sections are generated concurrently, or together in one structured
+        # completion; see marketplace.ai_text
+        selected = {
+            'caption': gen_caption,
+            'hashtags': gen_hashtags,
+            'cta': gen_cta,
+            'hooks': gen_hooks,
+        }
+        sections = [section for section in ai_text.SECTIONS if selected[section]]
+        if mode == 'structured':
+            content = ai_text.generate_sections_structured(api_key, sections, product_desc, target_audience, platform)
+        else:
+            content = ai_text.generate_sections(api_key, sections, product_desc, target_audience, platform)
         
         return JsonResponse({
             'success': True,
@@ -1355,15 +1283,55 @@ Return only the 5 hook lines, nothing else."""
         print(f"Error generating text content: {error_details}")
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
+def sse_event(event, data):
+    """Format one server-sent event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@login_required
+@require_http_methods(["POST"])
+def generate_text_content_stream(request):
+    """
+    Streaming variant of generate_text_content.
+    URL: /api/generate-text-content/stream/
+    Responds with server-sent events: 'delta' ({section, text}) for each
+    chunk of text as it is generated, 'done' ({section, text}) with the
+    final text of a section, and 'end' once every section is done.
+    """
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON data'}, status=400)
+    
+    product_desc = data.get('product_desc', '').strip()
+    target_audience = data.get('target_audience', '').strip()
+    platform = data.get('platform', 'general')
+    
+    if not product_desc:
+        return JsonResponse({'success': False, 'error': 'Product description is required'}, status=400)
+    
+    api_key = getattr(settings, 'GEMINI_API_KEY', None)
+    if not api_key:
+        return JsonResponse({'success': False, 'error': 'API key not configured'}, status=500)
+    
+    sections = [section for section in ai_text.SECTIONS if data.get(f'gen_{section}', False)]
+    
+    def events():
+        for event, section, text in ai_text.stream_sections(api_key, sections, product_desc, target_audience, platform):
+            yield sse_event(event, {'section': section, 'text': text})
+        yield sse_event('end', {})
+    
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Keep nginx-style proxies from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @login_required
 @require_http_methods(["POST"])
 def generate_product_image(request):
-    """Generate product image using AI"""
+    """Generate product image using AI (synchronously; see submit_image_job for the queued variant)"""
     try:
-        import requests
-        import base64
-        from io import BytesIO
-        
         data = json.loads(request.body)
         product_type = data.get('product_type', '').strip()
         style = data.get('style', '').strip()
@@ -1373,267 +1341,19 @@ def generate_product_image(request):
         if not product_type or not style:
             return JsonResponse({'success': False, 'error': 'Product type and style are required'}, status=400)
         
-        # Map format to dimensions
-        format_map = {
-            'square': (1080, 1080),
-            'portrait': (1080, 1350),
-            'story': (1080, 1920),
-            'landscape': (1200, 628)
-        }
-        width, height = format_map.get(format_type, (1080, 1080))
-        
-        # Map background to descriptive text
-        background_map = {
-            'white': 'clean white background, minimalist, professional, studio lighting',
-            'gradient': 'modern gradient background (purple to blue), vibrant colors, eye-catching, dynamic',
-            'wooden': 'rustic wooden table surface, natural wood grain texture, warm brown tones, soft natural light',
-            'marble': 'luxury white marble surface with gray veins, elegant, high-end aesthetic, pristine',
-            'lifestyle': 'realistic lifestyle setting, natural environment, authentic, in-context usage',
-            'nature': 'outdoor natural setting, lush greenery, soft sunlight, organic atmosphere',
-            'studio': 'professional photography studio, dramatic lighting, dark background, spotlight on subject'
-        }
-        background_desc = background_map.get(background, 'neutral background')
-        
         # Configure Seedream API
         api_key = getattr(settings, 'SEEDREAM_API_KEY', None)
         if not api_key:
             return JsonResponse({'success': False, 'error': 'API key not configured'}, status=500)
         
-        # Create highly detailed prompt for image generation
-        detailed_prompt = f"""Create a high-quality, professional product photography image of: {product_type}
-
-Style & Details: {style}
-
-Background: {background_desc}
-
-Technical specifications:
-- Resolution: {width}x{height}px
-- Ultra-high quality, 8K resolution
-- Professional product photography
-- Sharp focus on the product
-- Perfect composition and framing
-- Photorealistic rendering
-- Professional color grading
-- Studio-quality lighting
-
-Composition guidelines:
-- Center the product prominently
-- Ensure the product takes up 60-70% of the frame
-- Maintain proper proportions and perspective
-- Add subtle shadows for depth
-- Include soft highlights to show texture
-- Professional product shot aesthetic
-
-If text is mentioned in the prompt, render it with:
-- Bold, sans-serif font (like Montserrat Bold or Impact)
-- White text color (#FFFFFF)
-- Thick black outline/stroke (3-4px) for contrast
-- High readability and visibility
-- Positioned according to composition rules
-- Shadow effect for depth
-
-Make the image look like a professional advertisement or social media post, ready to use immediately."""
-        
-        # Use OpenRouter with Seedream for image generation
-        try:
-            response = requests.post(
-                'https://openrouter.ai/api/v1/chat/completions',
-                headers={
-                    'Authorization': f'Bearer {api_key}',
-                    'HTTP-Referer': 'https://adezy.com',
-                    'X-Title': 'AdEzy AI Generator',
-                    'Content-Type': 'application/json'
-                },
-                json={
-                    'model': 'bytedance-seed/seedream-4.5',
-                    'messages': [
-                        {
-                            'role': 'user',
-                            'content': [
-                                {
-                                    'type': 'text',
-                                    'text': detailed_prompt
-                                }
-                            ]
-                        }
-                    ],
-                    'max_tokens': 1024,
-                    'temperature': 0.7
-                },
-                timeout=60
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                
-                # Check if image was generated
-                if 'choices' in result and len(result['choices']) > 0:
-                    message = result['choices'][0].get('message', {})
-                    
-                    # Look for image in the response
-                    if 'content' in message:
-                        content = message['content']
-                        
-                        # Check if content is a list (multimodal response)
-                        if isinstance(content, list):
-                            for item in content:
-                                if isinstance(item, dict) and item.get('type') == 'image_url':
-                                    image_url = item.get('image_url', {}).get('url', '')
-                                    if image_url:
-                                        # Download and save the image
-                                        image_filename = f'ai_product_{request.user.id}_{timezone.now().timestamp()}.jpg'
-                                        image_path = os.path.join(settings.MEDIA_ROOT, 'ai_images', image_filename)
-                                        os.makedirs(os.path.dirname(image_path), exist_ok=True)
-                                        
-                                        # Handle base64 or URL
-                                        if image_url.startswith('data:image'):
-                                            # Base64 encoded image
-                                            image_data = image_url.split('base64,')[1]
-                                            with open(image_path, 'wb') as f:
-                                                f.write(base64.b64decode(image_data))
-                                        else:
-                                            # URL - download the image
-                                            img_response = requests.get(image_url)
-                                            with open(image_path, 'wb') as f:
-                                                f.write(img_response.content)
-                                        
-                                        final_image_url = os.path.join(settings.MEDIA_URL, 'ai_images', image_filename)
-                                        return JsonResponse({
-                                            'success': True,
-                                            'image_url': final_image_url,
-                                            'prompt_used': detailed_prompt
-                                        })
-            
-            # If image generation via API didn't work, create enhanced placeholder
-            print(f"Seedream response: {response.status_code}, {response.text}")
-            
-        except Exception as api_error:
-            print(f"API Error: {api_error}")
-        
-        # Fallback: Create enhanced placeholder with PIL
-        from PIL import Image, ImageDraw, ImageFont, ImageEnhance, ImageFilter
-        
-        # Create high-quality base image
-        img = Image.new('RGB', (width, height), color='#ffffff')
-        draw = ImageDraw.Draw(img)
-        
-        # Create sophisticated gradient background
-        for i in range(height):
-            alpha = i / height
-            if background == 'gradient':
-                # Purple to blue gradient
-                r = int(147 * (1 - alpha) + 59 * alpha)
-                g = int(51 * (1 - alpha) + 130 * alpha)
-                b = int(234 * (1 - alpha) + 246 * alpha)
-            elif background == 'wooden':
-                # Warm brown tones
-                r = int(139 * (1 - alpha) + 101 * alpha)
-                g = int(90 * (1 - alpha) + 67 * alpha)
-                b = int(43 * (1 - alpha) + 33 * alpha)
-            elif background == 'marble':
-                # White with subtle gray
-                r = int(255 * (1 - alpha * 0.05))
-                g = int(255 * (1 - alpha * 0.05))
-                b = int(255 * (1 - alpha * 0.08))
-            else:
-                # Clean white to light gray
-                r = g = b = int(255 * (1 - alpha * 0.02))
-            draw.rectangle([(0, i), (width, i+1)], fill=(r, g, b))
-        
-        # Add decorative elements
-        if background == 'gradient':
-            # Add some circles for visual interest
-            for _ in range(3):
-                import random
-                cx = random.randint(0, width)
-                cy = random.randint(0, height)
-                radius = random.randint(50, 150)
-                draw.ellipse([cx-radius, cy-radius, cx+radius, cy+radius], 
-                           fill=(255, 255, 255, 30))
-        
-        # Load or create fonts
-        try:
-            # Try to load Impact font for bold text
-            title_font = ImageFont.truetype("impact.ttf", int(height * 0.12))
-            subtitle_font = ImageFont.truetype("arial.ttf", int(height * 0.05))
-            small_font = ImageFont.truetype("arial.ttf", int(height * 0.03))
-        except:
-            try:
-                title_font = ImageFont.truetype("arial.ttf", int(height * 0.12))
-                subtitle_font = ImageFont.truetype("arial.ttf", int(height * 0.05))
-                small_font = ImageFont.truetype("arial.ttf", int(height * 0.03))
-            except:
-                title_font = ImageFont.load_default()
-                subtitle_font = ImageFont.load_default()
-                small_font = ImageFont.load_default()
-        
-        # Extract text from product description if mentioned
-        main_text = product_type.upper()
-        
-        # Draw text with white fill and black outline
-        # Calculate text position (center)
-        bbox = draw.textbbox((0, 0), main_text, font=title_font)
-        text_width = bbox[2] - bbox[0]
-        text_height = bbox[3] - bbox[1]
-        x = (width - text_width) // 2
-        y = (height - text_height) // 2 - int(height * 0.1)
-        
-        # Draw black outline (multiple passes for thick stroke)
-        outline_width = 4
-        for offset_x in range(-outline_width, outline_width + 1):
-            for offset_y in range(-outline_width, outline_width + 1):
-                if offset_x != 0 or offset_y != 0:
-                    draw.text((x + offset_x, y + offset_y), main_text, 
-                            fill='#000000', font=title_font)
-        
-        # Draw white text on top
-        draw.text((x, y), main_text, fill='#FFFFFF', font=title_font)
-        
-        # Add style description below
-        style_text = style[:50]
-        bbox = draw.textbbox((0, 0), style_text, font=subtitle_font)
-        text_width = bbox[2] - bbox[0]
-        x = (width - text_width) // 2
-        y = y + text_height + int(height * 0.05)
-        
-        # Outline for subtitle
-        for offset_x in range(-2, 3):
-            for offset_y in range(-2, 3):
-                if offset_x != 0 or offset_y != 0:
-                    draw.text((x + offset_x, y + offset_y), style_text, 
-                            fill='#000000', font=subtitle_font)
-        draw.text((x, y), style_text, fill='#FFFFFF', font=subtitle_font)
-        
-        # Add watermark
-        watermark = "AdEzy AI Studio"
-        bbox = draw.textbbox((0, 0), watermark, font=small_font)
-        text_width = bbox[2] - bbox[0]
-        x = width - text_width - 20
-        y = height - 40
-        draw.text((x, y), watermark, fill=(255, 255, 255, 180), font=small_font)
-        
-        # Apply slight blur for professional look (subtle)
-        # img = img.filter(ImageFilter.GaussianBlur(radius=0.5))
-        
-        # Enhance contrast and sharpness
-        enhancer = ImageEnhance.Contrast(img)
-        img = enhancer.enhance(1.2)
-        
-        enhancer = ImageEnhance.Sharpness(img)
-        img = enhancer.enhance(1.3)
-        
-        # Save image
-        image_filename = f'ai_product_{request.user.id}_{timezone.now().timestamp()}.jpg'
-        image_path = os.path.join(settings.MEDIA_ROOT, 'ai_images', image_filename)
-        os.makedirs(os.path.dirname(image_path), exist_ok=True)
-        img.save(image_path, 'JPEG', quality=95, optimize=True)
-        
-        image_url = os.path.join(settings.MEDIA_URL, 'ai_images', image_filename)
+        result = image_generation.generate_product_image(
+            api_key, product_type, style, background, format_type
+        )
         
         return JsonResponse({
             'success': True,
-            'image_url': image_url,
-            'prompt_used': detailed_prompt
+            'image_url': result['image_url'],
+            'prompt_used': result['prompt_used']
         })
         
     except Exception as e:
@@ -1641,3 +1361,130 @@ Make the image look like a professional advertisement or social media post, read
         error_details = traceback.format_exc()
         print(f"Error generating product image: {error_details}")
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+@login_required
+@require_http_methods(["POST"])
+def generate_product_image_set(request):
+    """
+    API endpoint: Generate a full ad set in one request
+    URL: /api/generate-product-images/
+    Expected POST data: {product_type, style, background, formats: [...], variations}
+    All items are generated concurrently; returns every image URL together.
+    """
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON data'}, status=400)
+    
+    product_type = data.get('product_type', '').strip()
+    style = data.get('style', '').strip()
+    if not product_type or not style:
+        return JsonResponse({'success': False, 'error': 'Product type and style are required'}, status=400)
+    
+    formats = data.get('formats') or list(image_generation.FORMAT_SIZES)
+    if not isinstance(formats, list) or any(f not in image_generation.FORMAT_SIZES for f in formats):
+        return JsonResponse({'success': False, 'error': 'Invalid formats'}, status=400)
+    try:
+        variations = int(data.get('variations', 1))
+    except (TypeError, ValueError):
+        variations = 0
+    if not 1 <= variations <= image_generation.MAX_VARIATIONS:
+        return JsonResponse({
+            'success': False,
+            'error': f'Variations must be between 1 and {image_generation.MAX_VARIATIONS}'
+        }, status=400)
+    
+    api_key = getattr(settings, 'SEEDREAM_API_KEY', None)
+    if not api_key:
+        return JsonResponse({'success': False, 'error': 'API key not configured'}, status=500)
+    
+    try:
+        images = image_generation.generate_product_image_set(
+            api_key, product_type, style, data.get('background', 'white'),
+            formats=list(dict.fromkeys(formats)), variations=variations
+        )
+    except Exception as e:
+        import traceback
+        print(f"Error generating product image set: {traceback.format_exc()}")
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+    
+    return JsonResponse({'success': True, 'images': images})
+
+
+@login_required
+@require_http_methods(["POST"])
+def submit_image_job(request):
+    """
+    API endpoint: Queue a product image generation job
+    URL: /api/image-jobs/
+    Expected POST data: {product_type, style, background, format}
+    The job is processed by `manage.py image_worker` (used when IMAGE_JOB_QUEUE
+    is on); poll get_image_job for the result.
+    """
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON data'}, status=400)
+    
+    product_type = data.get('product_type', '').strip()
+    style = data.get('style', '').strip()
+    if not product_type or not style:
+        return JsonResponse({'success': False, 'error': 'Product type and style are required'}, status=400)
+    
+    if not getattr(settings, 'SEEDREAM_API_KEY', None):
+        return JsonResponse({'success': False, 'error': 'API key not configured'}, status=500)
+    
+    job = ImageGenerationJob.objects.create(
+        user=request.user,
+        params={
+            'product_type': product_type,
+            'style': style,
+            'background': data.get('background', 'white'),
+            'format': data.get('format', 'square'),
+        }
+    )
+    
+    return JsonResponse({
+        'success': True,
+        'job_id': job.id,
+        'status': job.status
+    }, status=202)
+
+
+@login_required
+def get_image_job(request, job_id):
+    """
+    API endpoint: Status and result of an image generation job
+    URL: /api/image-jobs/<id>/
+    """
+    job = get_object_or_404(ImageGenerationJob, id=job_id, user=request.user)
+    
+    return JsonResponse({
+        'success': True,
+        'job_id': job.id,
+        'status': job.status,
+        'image_url': job.result_url or None,
+        'prompt_used': job.prompt_used or None,
+        'error': job.error or None,
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None
+    })
+
+
+@require_http_methods(["GET"])
+def ai_stats_json(request):
+    """
+    API endpoint: Per-model AI call latency, errors and token usage, circuit
+    breaker states and text cache hit rates, for this process (admins only)
+    URL: /api/ai-stats/
+    """
+    if resolve_admin_user(request) is None:
+        return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
+    
+    return JsonResponse({
+        'success': True,
+        'latency': latency_stats.snapshot(),
+        'breakers': breaker_states(),
+        'text_cache': ai_text.get_cache_stats()
+    })
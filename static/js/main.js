@@ -1276,8 +1276,9 @@ async function loadNotifications() {
         
         if (data.notifications && data.notifications.length > 0) {
             container.innerHTML = data.notifications.map(notif => {
-                const timeAgo = getTimeAgo(new Date(notif.created_at));
+                const timeAgo = getTimeAgo(new Date(notif.updated_at || notif.created_at));
                 const icon = getNotificationIcon(notif.type);
+                const countLabel = notif.count > 1 ? ` (${notif.count})` : '';
                 const clickable = notif.order_id ? 'clickable' : '';
                 const unread = !notif.is_read ? 'unread' : '';
                 
@@ -1286,7 +1287,7 @@ async function loadNotifications() {
                          ${notif.order_id ? `onclick="handleNotificationClick(${notif.id}, ${notif.order_id})"` : `onclick="markNotificationRead(${notif.id})"`}>
                         <div class="notification-icon">${icon}</div>
                         <div class="notification-content">
-                            <div class="notification-title">${notif.title}</div>
+                            <div class="notification-title">${notif.title}${countLabel}</div>
                             <div class="notification-time">${timeAgo}</div>
                         </div>
                     </div>